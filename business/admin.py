@@ -1,7 +1,25 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .catalogue import CatalogueImporter, CatalogueImportError
 from .models import TeamMember, ProductCategory, Brand, Product
 
 
+class CatalogueImportForm(forms.Form):
+    workbook = forms.FileField(
+        help_text="An .xlsx sheet with name, brand and category columns"
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        help_text="Only show what would change"
+    )
+
+
 @admin.register(TeamMember)
 class TeamMemberAdmin(admin.ModelAdmin):
     list_display = ['name', 'position', 'email', 'is_active', 'order']
@@ -32,6 +50,10 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ['is_featured', 'is_active']
     prepopulated_fields = {'slug': ('name',)}
     date_hierarchy = 'created_at'
+    change_list_template = 'admin/business/product/change_list.html'
+
+    # Lines of the import diff shown in the admin; the rest is summarised
+    import_preview_lines = 500
     
     fieldsets = (
         ('Basic Information', {
@@ -48,3 +70,53 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('is_featured', 'is_active')
         })
     )
+
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_catalogue_view),
+                name='business_product_import',
+            ),
+        ] + super().get_urls()
+
+    def import_catalogue_view(self, request):
+        """Upload a spreadsheet and import it through CatalogueImporter"""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        form = CatalogueImportForm(request.POST or None, request.FILES or None)
+        diff = []
+        stats = None
+
+        def write(line):
+            if len(diff) < self.import_preview_lines:
+                diff.append(line)
+
+        if request.method == 'POST' and form.is_valid():
+            dry_run = form.cleaned_data['dry_run']
+            importer = CatalogueImporter(dry_run=dry_run, write=write)
+            try:
+                stats = importer.run(form.cleaned_data['workbook'])
+            except CatalogueImportError as e:
+                form.add_error('workbook', str(e))
+            else:
+                if not dry_run:
+                    self.message_user(
+                        request,
+                        f"Imported catalogue: {stats['created']} created, "
+                        f"{stats['updated']} updated, {stats['skipped']} skipped.",
+                        messages.SUCCESS,
+                    )
+                    return redirect('admin:business_product_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import catalogue",
+            'form': form,
+            'diff': diff,
+            'diff_truncated': len(diff) >= self.import_preview_lines,
+            'stats': stats,
+        }
+        return TemplateResponse(request, 'admin/business/product/import_catalogue.html', context)
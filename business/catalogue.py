@@ -0,0 +1,527 @@
+"""
+Bulk catalogue import and export shared by management commands, views and
+the admin.
+"""
+import csv
+import json
+import zlib
+from collections import Counter
+from zipfile import BadZipFile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.text import slugify
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .models import Brand, CatalogueChange, Partner, Product, ProductCategory, ProductSpecValue, ProductsPage
+from .search_index import queue_index_update
+from .surrogate import purge_surrogate_keys
+from .versions import bump_content_version
+
+
+# Product fields an import row can set, besides the slug
+PRODUCT_FIELDS = [
+    'name', 'description', 'brand_id', 'category_id', 'image_url',
+    'is_featured', 'is_active', 'specifications',
+]
+
+# Columns that hold a value for a single specification key, e.g. "spec.pack_size"
+SPEC_PREFIX = 'spec.'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+
+
+class CatalogueImportError(Exception):
+    """Raised when a spreadsheet can't be imported at all"""
+
+
+# Models with an active_product_count, and the Product lookup they group by
+PRODUCT_COUNT_LOOKUPS = [
+    (ProductCategory, 'category'),
+    (Brand, 'brand'),
+    (Partner, 'brand__partner'),
+]
+
+
+def adjust_product_counts(category_id, brand_id, delta):
+    """Add ``delta`` to the active product counts a single product feeds"""
+    counter = Greatest(F('active_product_count') + delta, 0)
+    with transaction.atomic():
+        ProductCategory.objects.filter(pk=category_id).update(active_product_count=counter)
+        Brand.objects.filter(pk=brand_id).update(active_product_count=counter)
+        Partner.objects.filter(brands=brand_id).update(active_product_count=counter)
+
+
+def reconcile_product_counts():
+    """
+    Recompute every active_product_count from the products table.
+
+    Each model is fixed with a single UPDATE over a grouped count subquery
+    that only touches rows whose stored count is wrong. Returns the number
+    of rows corrected per model.
+    """
+    corrected = {}
+    active = Product.objects.filter(is_active=True).order_by()
+    with transaction.atomic():
+        for model, lookup in PRODUCT_COUNT_LOOKUPS:
+            counts = active.filter(**{lookup: OuterRef('pk')}).values(lookup).annotate(n=Count('pk')).values('n')
+            actual = Coalesce(Subquery(counts), 0)
+            corrected[model] = (
+                model.objects.annotate(actual=actual)
+                .exclude(active_product_count=F('actual'))
+                .update(active_product_count=actual)
+            )
+    return corrected
+
+
+def spec_pairs(specifications):
+    """
+    (key, value) pairs a product contributes to the specification catalogue.
+
+    Only scalar values are listed; numbers and booleans are stored in their
+    JSON spelling so "24" and 24 end up as the same choice.
+    """
+    for key, value in (specifications or {}).items():
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        text = value if isinstance(value, str) else json.dumps(value)
+        if len(key) <= 100 and len(text) <= 255:
+            yield key, text
+
+
+def adjust_spec_values(before, after):
+    """Move spec value counts from one product's old specifications to its new ones"""
+    before, after = Counter(spec_pairs(before)), Counter(spec_pairs(after))
+    removed, added = before - after, after - before
+    if not removed and not added:
+        return
+
+    def matching(pairs):
+        condition = Q()
+        for key, value in pairs:
+            condition |= Q(key=key, value=value)
+        return ProductSpecValue.objects.filter(condition)
+
+    with transaction.atomic():
+        if removed:
+            matching(removed).update(product_count=Greatest(F('product_count') - 1, 0))
+            matching(removed).filter(product_count=0).delete()
+        if added:
+            ProductSpecValue.objects.bulk_create(
+                [ProductSpecValue(key=key, value=value) for key, value in added],
+                ignore_conflicts=True,
+            )
+            matching(added).update(product_count=F('product_count') + 1)
+
+
+def rebuild_spec_values():
+    """
+    Recompute the specification value catalogue from the active products.
+
+    Returns the number of distinct (key, value) pairs.
+    """
+    counts = Counter()
+    specifications = Product.objects.filter(is_active=True).values_list('specifications', flat=True)
+    for specs in specifications.iterator(chunk_size=2000):
+        counts.update(spec_pairs(specs))
+    with transaction.atomic():
+        ProductSpecValue.objects.all().delete()
+        ProductSpecValue.objects.bulk_create(
+            [ProductSpecValue(key=key, value=value, product_count=n) for (key, value), n in counts.items()],
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+class CatalogueImporter:
+    """
+    Stream product rows from an .xlsx workbook into the catalogue.
+
+    The first row of the sheet is a header naming the columns: ``name``,
+    ``brand`` and ``category`` are required; ``slug``, ``description``,
+    ``partner``, ``image_url``, ``is_featured``, ``is_active``,
+    ``specifications`` (a JSON object, as exported) and any ``spec.<key>``
+    columns are optional. Blank cells leave the existing value alone; a
+    ``specifications`` cell replaces all of a product's specifications and
+    ``spec.<key>`` cells set single keys.
+
+    Rows are read in openpyxl's read-only mode and upserted in batches,
+    by slug or, for rows without one, by brand and name, so memory use depends on the batch size rather than the sheet
+    size. Brand, category and partner names are resolved through in-memory
+    maps and created when missing. With ``dry_run`` nothing is written and
+    the changes are only reported through ``write``.
+    """
+
+    def __init__(self, dry_run=False, batch_size=1000, write=None):
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.write = write or (lambda line: None)
+        self.stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+        self.categories = {obj.name.lower(): obj for obj in ProductCategory.objects.all()}
+        self.partners = {obj.name.lower(): obj for obj in Partner.objects.all()}
+        self.brands = {obj.name.lower(): obj for obj in Brand.objects.all()}
+
+    def run(self, file, sheet=None):
+        """Import every row of ``sheet`` (default: the active sheet)"""
+        try:
+            workbook = load_workbook(file, read_only=True, data_only=True)
+        except (BadZipFile, InvalidFileException) as e:
+            raise CatalogueImportError(f"Not a readable .xlsx workbook: {e}")
+
+        try:
+            try:
+                worksheet = workbook[sheet] if sheet else workbook.active
+            except KeyError:
+                raise CatalogueImportError(f"Worksheet '{sheet}' not found.")
+
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                raise CatalogueImportError("The worksheet is empty.")
+            columns = self.parse_header(header)
+
+            with transaction.atomic():
+                batch = []
+                for line, values in enumerate(rows, start=2):
+                    row = self.parse_row(columns, values, line)
+                    if row is None:
+                        continue
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        self.flush(batch)
+                        batch = []
+                if batch:
+                    self.flush(batch)
+                if not self.dry_run and (self.stats['created'] or self.stats['updated']):
+                    reconcile_product_counts()
+                    rebuild_spec_values()
+        finally:
+            workbook.close()
+
+        return self.stats
+
+    def parse_header(self, header):
+        columns = [str(value).strip().lower() if value is not None else None for value in header]
+        missing = {'name', 'brand', 'category'} - set(columns)
+        if missing:
+            raise CatalogueImportError(f"Missing required columns: {', '.join(sorted(missing))}")
+        return columns
+
+    def parse_row(self, columns, values, line):
+        """Turn a sheet row into a dict of product values, or None to skip it"""
+        cells = {}
+        specifications = {}
+        for column, value in zip(columns, values):
+            if column is None or value is None or value == '':
+                continue
+            if column.startswith(SPEC_PREFIX):
+                specifications[column[len(SPEC_PREFIX):]] = value
+            else:
+                cells[column] = value.strip() if isinstance(value, str) else value
+
+        if not cells and not specifications:
+            return None
+        for column in ('name', 'brand', 'category'):
+            if not cells.get(column):
+                self.stats['skipped'] += 1
+                self.write(f"! line {line}: missing {column}, skipped")
+                return None
+
+        if 'specifications' in cells:
+            try:
+                replaced = json.loads(str(cells['specifications']))
+            except ValueError:
+                replaced = None
+            if not isinstance(replaced, dict):
+                self.stats['skipped'] += 1
+                self.write(f"! line {line}: specifications must be a JSON object, skipped")
+                return None
+            specifications = {**replaced, **specifications}
+
+        flags = {}
+        for column in ('is_featured', 'is_active'):
+            if column in cells:
+                flags[column] = self.parse_bool(cells[column])
+                if flags[column] is None:
+                    self.stats['skipped'] += 1
+                    self.write(f"! line {line}: {column} must be yes/no, got {cells[column]!r}, skipped")
+                    return None
+
+        brand = self.resolve_brand(str(cells['brand']), cells.get('partner'))
+        category = self.resolve(self.categories, ProductCategory, str(cells['category']))
+
+        row = {
+            'line': line,
+            'name': str(cells['name']),
+            'brand': brand,
+            'brand_id': brand.pk,
+            'category_id': category.pk,
+            'specifications': specifications,
+            'replace_specifications': 'specifications' in cells,
+            **flags,
+        }
+        for column in ('description', 'image_url'):
+            if column in cells:
+                row[column] = str(cells[column])
+
+        if cells.get('slug'):
+            row['slug'] = slugify(str(cells['slug']))[:255]
+            row['slug_generated'] = False
+        else:
+            row['slug'] = slugify(f"{brand.name} {row['name']}")[:240]
+            row['slug_generated'] = True
+        return row
+
+    def parse_bool(self, value):
+        if isinstance(value, bool):
+            return value
+        value = str(value).strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        return None
+
+    def resolve(self, cache, model, name, **defaults):
+        """Look ``name`` up in ``cache``, creating the row when it's missing"""
+        obj = cache.get(name.lower())
+        if obj is None:
+            obj = model(name=name, **defaults)
+            if not self.dry_run:
+                obj.save()
+            self.write(f"+ {model._meta.verbose_name} {name}")
+            cache[name.lower()] = obj
+        return obj
+
+    def resolve_brand(self, name, partner_name):
+        partner = None
+        if partner_name:
+            partner = self.resolve(self.partners, Partner, str(partner_name))
+        return self.resolve(self.brands, Brand, name, partner=partner)
+
+    def match_products(self, batch, existing):
+        """Point rows without a slug at the existing product with their brand and name"""
+        rows = [row for row in batch if row['slug_generated']]
+        if not rows:
+            return
+        products = Product.objects.filter(
+            brand_id__in={row['brand_id'] for row in rows},
+            name__in={row['name'] for row in rows},
+        ).order_by('pk')
+        matches = {}
+        for product in products:
+            matches.setdefault((product.brand_id, product.name), product)
+        for row in rows:
+            product = matches.get((row['brand_id'], row['name']))
+            if product is not None:
+                row['slug'] = product.slug
+                row['slug_generated'] = False
+                existing[product.slug] = product
+
+    def assign_slugs(self, batch, existing):
+        """
+        Give rows still without a slug one that no other product has, adding
+        the next free -N suffix on a collision.
+        """
+        claimed = {}
+        for row in batch:
+            identity = (row['brand_id'], row['name'])
+            if not row['slug_generated']:
+                claimed[row['slug']] = identity
+                continue
+
+            base = row['slug']
+            # Rows of the same new product share its slug
+            if claimed.get(base, identity) == identity and base not in existing:
+                claimed[base] = identity
+                continue
+
+            taken = set(claimed) | set(existing)
+            taken.update(Product.objects.filter(slug__startswith=f"{base}-").values_list('slug', flat=True))
+            suffix = 2
+            while f"{base}-{suffix}" in taken:
+                suffix += 1
+            row['slug'] = f"{base}-{suffix}"
+            claimed[row['slug']] = identity
+
+    def flush(self, batch):
+        """Upsert one batch of parsed rows"""
+        existing = {}
+        self.match_products(batch, existing)
+        existing.update(
+            (product.slug, product)
+            for product in Product.objects.filter(
+                slug__in=[row['slug'] for row in batch if row['slug'] not in existing]
+            )
+        )
+        self.assign_slugs(batch, existing)
+
+        # A slug repeated within the batch is imported once, last row wins
+        rows = {row['slug']: row for row in batch}
+
+        to_create, to_update, changed_fields = [], [], set()
+        for slug, row in rows.items():
+            product = existing.get(slug)
+            values = {field: row[field] for field in PRODUCT_FIELDS if field in row}
+
+            if product is None:
+                product = Product(slug=slug, **values)
+                to_create.append(product)
+                self.write(f"+ product {slug} ({row['brand'].name} {row['name']})")
+                continue
+
+            if not row['replace_specifications']:
+                values['specifications'] = {**product.specifications, **values['specifications']}
+            changed = [
+                field for field, value in values.items()
+                if getattr(product, field) != value
+            ]
+            if not changed:
+                self.stats['unchanged'] += 1
+                continue
+            for field in changed:
+                self.write(f"~ product {slug}: {field} {getattr(product, field)!r} -> {values[field]!r}")
+                setattr(product, field, values[field])
+            changed_fields.update(changed)
+            to_update.append(product)
+
+        self.stats['created'] += len(to_create)
+        self.stats['updated'] += len(to_update)
+        if self.dry_run:
+            return
+
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if any(product.pk is None for product in to_create):
+                # Backend couldn't return primary keys from the bulk insert
+                to_create = list(Product.objects.filter(slug__in=[p.slug for p in to_create]))
+        if to_update:
+            # bulk_update() skips auto_now, so bump the timestamp ourselves
+            now = timezone.now()
+            for product in to_update:
+                product.updated_at = now
+            Product.objects.bulk_update(
+                to_update, sorted(changed_fields) + ['updated_at'],
+                batch_size=self.batch_size,
+            )
+        # bulk_create() and bulk_update() send no signals
+        ProductsPage.refresh_products(to_create + to_update)
+        queue_index_update(Product, [product.pk for product in to_create + to_update])
+        CatalogueChange.record(Product, [product.pk for product in to_create], CatalogueChange.INSERT)
+        CatalogueChange.record(Product, [product.pk for product in to_update], CatalogueChange.UPDATE)
+        if to_create or to_update:
+            purge_surrogate_keys([f"product-{product.pk}" for product in to_update] + ["product-list"])
+            bump_content_version('product')
+
+
+# Columns written by the exporters; the first ones match the import sheet
+# so an export can be edited and imported again.
+EXPORT_FIELDS = [
+    ('name', 'name'),
+    ('slug', 'slug'),
+    ('description', 'description'),
+    ('brand', 'brand__name'),
+    ('category', 'category__name'),
+    ('partner', 'brand__partner__name'),
+    ('image_url', 'image_url'),
+    ('is_featured', 'is_featured'),
+    ('is_active', 'is_active'),
+    ('specifications', 'specifications'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+EXPORT_COLUMNS = [column for column, _ in EXPORT_FIELDS]
+SPECIFICATIONS_INDEX = EXPORT_COLUMNS.index('specifications')
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Rows fetched per round trip; on PostgreSQL iterator() uses a server-side
+# cursor, so only this many rows are held in memory at a time.
+EXPORT_CHUNK_SIZE = 2000
+
+# Bytes collected before a streamed chunk is handed to the client
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def export_rows(include_inactive=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one tuple per product, in EXPORT_COLUMNS order"""
+    products = Product.objects.all() if include_inactive else Product.objects.filter(is_active=True)
+    return products.order_by('pk').values_list(
+        *[lookup for _, lookup in EXPORT_FIELDS]
+    ).iterator(chunk_size=chunk_size)
+
+
+def _buffered(lines):
+    """Join small encoded lines into chunks of about STREAM_BUFFER_SIZE"""
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= STREAM_BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(EXPORT_COLUMNS).encode()
+        for row in rows:
+            row = list(row)
+            row[SPECIFICATIONS_INDEX] = json.dumps(row[SPECIFICATIONS_INDEX], ensure_ascii=False)
+            yield writer.writerow(row).encode()
+
+    return _buffered(lines())
+
+
+def iter_jsonl(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    return _buffered(
+        (encoder.encode(dict(zip(EXPORT_COLUMNS, row))) + '\n').encode()
+        for row in rows
+    )
+
+
+def iter_gzip(chunks):
+    """Gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def write_xlsx(rows, file):
+    """Write rows to ``file`` with openpyxl's write-only (streaming) workbook"""
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Products')
+    worksheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        row = list(row)
+        row[SPECIFICATIONS_INDEX] = json.dumps(row[SPECIFICATIONS_INDEX], ensure_ascii=False)
+        # Excel can't store timezone-aware datetimes
+        row[-2:] = [timezone.make_naive(value) if value else value for value in row[-2:]]
+        worksheet.append(row)
+    workbook.save(file)
+
@@ -0,0 +1,234 @@
+"""
+Critical CSS for each page type.
+
+Site and page stylesheets live in static/css and are fingerprinted by the
+static files storage. Rather than blocking the first paint on them, a page
+inlines the rules its above-the-fold markup uses and loads the full
+stylesheets asynchronously. ``{% critical_css %}`` does this for the page
+type being rendered (named after the page template, e.g. ``home_page``)
+from the static file ``critical/<page type>.css``, which
+``build_critical_css`` derives by rendering one page of each type and
+keeping the rules whose selectors match the header and the top of the main
+content. The files are read as plain text once per process. Page types
+without a critical file get ordinary render-blocking stylesheets.
+"""
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+WHITESPACE_RE = re.compile(r'\s+')
+# Pseudo-classes and attribute selectors don't change which classes and ids
+# a rule needs; interaction states can't apply before the first paint
+PSEUDO_RE = re.compile(r'::?[\w-]+(\([^)]*\))?|\[[^\]]*\]')
+INTERACTIVE_RE = re.compile(r':(hover|focus|focus-within|focus-visible|active|visited)\b')
+NAME_RE = re.compile(r'([.#])(-?[_a-zA-Z][\w-]*)')
+ANIMATION_RE = re.compile(r'animation(?:-name)?\s*:([^;]*)')
+
+# At-rules whose bodies hold ordinary rules
+GROUPING_RULES = ('@media', '@supports')
+
+# Start tags inside <main> counted as above the fold
+FOLD_ELEMENTS = 150
+
+
+def template_page_type(template_name):
+    """Page type of a template name, e.g. "home_page" for business/home_page.html"""
+    if isinstance(template_name, (list, tuple)):
+        template_name = template_name[0] if template_name else None
+    if not isinstance(template_name, str):
+        return None
+    return template_name.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+
+
+def page_type(context):
+    """Critical CSS name of the page being rendered, from its template name"""
+    return template_page_type(context.template.origin.template_name) or ''
+
+
+# Critical CSS read so far by page type, None where a type has none
+critical_files = {}
+
+
+def get_critical_css(name):
+    """Contents of critical/<name>.css, read once per process unless DEBUG"""
+    if name in critical_files and not settings.DEBUG:
+        return critical_files[name]
+    css = None
+    path = finders.find(f'critical/{name}.css') if name else None
+    if path:
+        with open(path, encoding='utf-8') as f:
+            css = f.read()
+    critical_files[name] = css
+    return css
+
+
+def render_stylesheets(context, stylesheets):
+    """
+    Inline the critical CSS of the current page type and load
+    ``stylesheets`` without blocking rendering, or as ordinary stylesheets
+    when the page type has no critical CSS.
+    """
+    name = page_type(context)
+    urls = [static(path) for path in stylesheets]
+    critical = get_critical_css(name)
+    if critical is None:
+        return format_html_join(
+            '\n', '<link rel="stylesheet" href="{}" data-critical="{}">', ((url, name) for url in urls)
+        )
+    return format_html('<style data-critical="{}">{}</style>\n', name, mark_safe(critical)) + format_html_join(
+        '\n',
+        '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'" '
+        'data-critical="{}"><noscript><link rel="stylesheet" href="{}"></noscript>',
+        ((url, name, url) for url in urls),
+    )
+
+
+# Stylesheets
+
+def parse_rules(css):
+    """
+    Split a stylesheet into ``(prelude, body)`` pairs. Bodies of @media and
+    @supports are parsed into pairs as well; other bodies are kept as text.
+    """
+    css = COMMENT_RE.sub('', css)
+    rules = []
+    position = 0
+    while True:
+        start = css.find('{', position)
+        if start == -1:
+            return rules
+        depth, end = 1, start + 1
+        while depth and end < len(css):
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+            end += 1
+        prelude = WHITESPACE_RE.sub(' ', css[position:start]).strip()
+        body = css[start + 1:end - 1]
+        if prelude.startswith(GROUPING_RULES):
+            body = parse_rules(body)
+        rules.append((prelude, body))
+        position = end
+
+
+def serialise_rules(rules):
+    # One rule per line
+    return '\n'.join(
+        f"{prelude}{{\n{serialise_rules(body)}\n}}" if isinstance(body, list) else f"{prelude}{{{compact(body)}}}"
+        for prelude, body in rules
+    )
+
+
+def compact(declarations):
+    declarations = WHITESPACE_RE.sub(' ', declarations).strip()
+    return re.sub(r'\s*([:;,])\s*', r'\1', declarations).rstrip(';')
+
+
+def selector_matches(selector, classes, ids):
+    """Whether every class and id ``selector`` names is used on the page"""
+    if INTERACTIVE_RE.search(selector):
+        return False
+    for kind, name in NAME_RE.findall(PSEUDO_RE.sub('', selector)):
+        if name not in (classes if kind == '.' else ids):
+            return False
+    return True
+
+
+def critical_rules(rules, classes, ids):
+    """The rules of ``rules`` that apply to the given classes and ids"""
+    critical = []
+    for prelude, body in rules:
+        if isinstance(body, list):
+            body = critical_rules(body, classes, ids)
+            if body:
+                critical.append((prelude, body))
+        elif prelude.startswith('@'):
+            # @keyframes are added once the rules using them are known
+            continue
+        elif any(selector_matches(selector, classes, ids) for selector in prelude.split(',')):
+            critical.append((prelude, body))
+    return critical
+
+
+def animation_names(rules):
+    names = set()
+    for prelude, body in rules:
+        if isinstance(body, list):
+            names |= animation_names(body)
+        else:
+            for value in ANIMATION_RE.findall(body):
+                names.update(re.findall(r'[\w-]+', value))
+    return names
+
+
+def extract_critical_css(css, classes, ids):
+    """Critical subset of ``css`` for a page using ``classes`` and ``ids``"""
+    rules = parse_rules(css)
+    critical = critical_rules(rules, classes, ids)
+    names = animation_names(critical)
+    critical += [
+        (prelude, body) for prelude, body in rules
+        if prelude.startswith('@keyframes') and prelude.split()[-1] in names
+    ]
+    return serialise_rules(critical)
+
+
+def stylesheet_path(url):
+    """Source file of a static stylesheet URL, fingerprinted or not"""
+    name = urlparse(url).path.removeprefix(settings.STATIC_URL)
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    originals = {hashed: original for original, hashed in hashed_files.items()}
+    return finders.find(originals.get(name, name))
+
+
+# Pages
+
+class AboveTheFold(HTMLParser):
+    """
+    Collect the classes and ids of a rendered page's header and first
+    ``fold_elements`` elements of <main>, plus the page type and the
+    stylesheets ``{% critical_css %}`` wrote into it.
+    """
+
+    def __init__(self, fold_elements=FOLD_ELEMENTS):
+        super().__init__()
+        self.fold_elements = fold_elements
+        self.classes = set()
+        self.ids = set()
+        self.page_type = None
+        self.stylesheets = []
+        self.in_body = self.in_main = self.below_fold = False
+        self.main_elements = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if attrs.get('data-critical'):
+            self.page_type = attrs['data-critical']
+            if tag == 'link':
+                self.stylesheets.append(attrs['href'])
+        if tag == 'body':
+            self.in_body = True
+        elif tag == 'main':
+            self.in_main = True
+        elif self.in_main:
+            self.main_elements += 1
+            self.below_fold = self.main_elements > self.fold_elements
+        if self.in_body and not self.below_fold:
+            self.classes.update((attrs.get('class') or '').split())
+            if attrs.get('id'):
+                self.ids.add(attrs['id'])
+
+    def handle_endtag(self, tag):
+        if tag == 'main':
+            self.in_main = False
+            self.below_fold = True
@@ -0,0 +1,318 @@
+"""
+Minified, compressed HTML responses.
+
+HTMLMinifier strips comments and collapses whitespace between tags and in
+text, leaving <pre>, <textarea>, <script> (JSON-LD included), <style> and
+inline <svg> exactly as rendered. It works on chunks, so streaming
+responses are minified as they go out.
+
+CompressionMiddleware minifies HTML responses and compresses text
+responses with Brotli or gzip, whichever the browser accepts. The admin
+and other paths outside the fast path, and any other response carrying a
+CSRF token for a signed-in or session visitor, are sent uncompressed: a
+secret compressed next to reflected input leaks through the response
+length (BREACH). For fast
+path requests (anonymous public GETs, see business/middleware.py) the
+result is cached in the process's "local" cache by a digest of the
+rendered page, so a page served from the fragment and product caches is
+minified and compressed once rather than on every request. Set ``HTML_BYTE_BUDGETS`` to log a warning when a
+page type's minified HTML goes over budget::
+
+    HTML_BYTE_BUDGETS = {'home_page': 80_000, 'default': 40_000}
+
+Under ASGI the middleware's work, which is CPU bound and reads the cache,
+runs in a thread, like any MiddlewareMixin's.
+"""
+import codecs
+import gzip
+import hashlib
+import logging
+import re
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .critical_css import template_page_type
+from .middleware import FastPathMiddleware, is_fast_path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+# Elements whose contents are served exactly as rendered
+RAW_ELEMENTS = ('pre', 'textarea', 'script', 'style', 'svg')
+RAW_START_RE = re.compile(r'<(%s)\b' % '|'.join(RAW_ELEMENTS), re.I)
+RAW_END_RES = {element: re.compile(r'</%s\s*>' % element, re.I) for element in RAW_ELEMENTS}
+WHITESPACE_RE = re.compile(r'\s+')
+# A whole tag; quoted attribute values may contain '>'
+TAG_RE = re.compile(r'<[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>')
+# What follows the '<' of a tag, as opposed to a '<' in text
+TAG_START_RE = re.compile(r'[a-zA-Z/!?]')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/xml', 'application/javascript', 'image/svg+xml')
+MIN_COMPRESS_LENGTH = 200
+
+# Cached output is compressed once, so it can afford Brotli's best
+BROTLI_QUALITY = 5
+CACHED_BROTLI_QUALITY = 11
+CACHE_SECONDS = 60 * 60 * 24
+
+
+
+def collapse_whitespace(text):
+    """Runs of whitespace become one newline or space, whichever they held"""
+    return WHITESPACE_RE.sub(lambda m: '\n' if '\n' in m.group() else ' ', text)
+
+
+class HTMLMinifier:
+    """
+    Incremental HTML minifier: ``feed()`` chunks and join what it returns
+    with what ``close()`` returns.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.raw_element = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        return self.process(final=False)
+
+    def close(self):
+        return self.process(final=True)
+
+    def process(self, final):
+        output = []
+        buffer = self.buffer
+        position = 0
+        while position < len(buffer):
+            if self.raw_element:
+                end = RAW_END_RES[self.raw_element].search(buffer, position)
+                if end is None:
+                    break
+                output.append(buffer[position:end.end()])
+                position = end.end()
+                self.raw_element = None
+                continue
+
+            start = buffer.find('<', position)
+            if start == -1:
+                text = buffer[position:]
+                if not final:
+                    # More whitespace may follow in the next chunk
+                    trailing = len(text) - len(text.rstrip())
+                    text = text[:len(text) - trailing]
+                output.append(collapse_whitespace(text))
+                position += len(text)
+                break
+            if start > position:
+                output.append(collapse_whitespace(buffer[position:start]))
+                position = start
+
+            if buffer.startswith('<!--', position):
+                end = buffer.find('-->', position + 4)
+                if end == -1:
+                    break
+                comment = buffer[position:end + 3]
+                # Conditional comments still mean something to old browsers
+                if comment.startswith('<!--[if'):
+                    output.append(comment)
+                position = end + 3
+                continue
+
+            if not TAG_START_RE.match(buffer, position + 1):
+                if position + 1 == len(buffer) and not final:
+                    # The next chunk decides
+                    break
+                output.append('<')
+                position += 1
+                continue
+            match = TAG_RE.match(buffer, position)
+            if match is None:
+                break
+            tag = match.group()
+            output.append(tag)
+            position = match.end()
+            raw = RAW_START_RE.match(tag)
+            if raw and not tag.endswith('/>'):
+                self.raw_element = raw.group(1).lower()
+
+        if final:
+            output.append(buffer[position:])
+            position = len(buffer)
+        self.buffer = buffer[position:]
+        return ''.join(output)
+
+
+def accepted_encodings(header):
+    """Map the codings of an Accept-Encoding header to their q-values"""
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def minify_html(html):
+    minifier = HTMLMinifier()
+    return minifier.feed(html) + minifier.close()
+
+
+def compress(content, encoding, quality=BROTLI_QUALITY):
+    if encoding == 'br':
+        return brotli.compress(content, quality=quality)
+    return gzip.compress(content, mtime=0)
+
+
+def stream_compress(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def stream_minify(chunks, charset):
+    minifier = HTMLMinifier()
+    # Chunks may end part way through a multi-byte character
+    decoder = codecs.getincrementaldecoder(charset)()
+    for chunk in chunks:
+        data = minifier.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        if data:
+            yield data.encode(charset)
+    yield (minifier.feed(decoder.decode(b'', final=True)) + minifier.close()).encode(charset)
+
+
+def check_budget(request, response, size):
+    budgets = getattr(settings, 'HTML_BYTE_BUDGETS', {})
+    if not budgets:
+        return
+    page_type = getattr(response, 'page_type', None) or template_page_type(getattr(response, 'template_name', None))
+    budget = budgets.get(page_type, budgets.get('default'))
+    if budget is not None and size > budget:
+        logger.warning(
+            "%s (%s) is %d bytes of HTML, over its %d byte budget", request.path, page_type or 'page', size, budget
+        )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Minify HTML and compress text responses, caching the result for public pages"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.minify = getattr(settings, 'HTML_MINIFY', True)
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if response.has_header('Content-Encoding') or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        excluded = request.path_info.startswith(FastPathMiddleware.excluded_prefixes)
+        if excluded or (request.META.get('CSRF_COOKIE_USED') and not is_fast_path(request)):
+            encoding = None
+        else:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            encoding = self.negotiate(request)
+        minify = (
+            self.minify
+            and content_type == 'text/html'
+            and not getattr(response, 'minified', False)
+            and not excluded
+        )
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            if minify:
+                response.streaming_content = stream_minify(response.streaming_content, response.charset)
+            if encoding:
+                response.streaming_content = stream_compress(response.streaming_content, encoding)
+                del response['Content-Length']
+                self.set_encoding(response, encoding)
+            return response
+
+        if len(response.content) < MIN_COMPRESS_LENGTH:
+            encoding = None
+        if not (minify or encoding):
+            return response
+
+        if self.is_cacheable(request, response):
+            key = f"html:{hashlib.sha1(response.content).hexdigest()}:{int(minify)}:{encoding}"
+            content = caches['local'].get(key)
+            if content is None:
+                content = self.process(request, response, minify, encoding, CACHED_BROTLI_QUALITY)
+                caches['local'].set(key, content, CACHE_SECONDS)
+        else:
+            content = self.process(request, response, minify, encoding, BROTLI_QUALITY)
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        if encoding:
+            self.set_encoding(response, encoding)
+        return response
+
+    def negotiate(self, request):
+        """The accepted encoding with the highest q-value, Brotli on a tie"""
+        qualities = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        available = ['br', 'gzip'] if brotli is not None else ['gzip']
+        candidates = [
+            (qualities.get(encoding, qualities.get('*', 0)), encoding) for encoding in available
+        ]
+        quality, encoding = max(candidates, key=lambda candidate: candidate[0])
+        return encoding if quality > 0 else None
+
+    def is_cacheable(self, request, response):
+        """
+        Public pages only: anything else is either unique per visitor or
+        carries a CSRF token, which is masked differently on every response.
+        """
+        return (
+            is_fast_path(request)
+            and response.status_code == 200
+            and not request.META.get('CSRF_COOKIE_USED')
+            and not response.cookies
+        )
+
+    def process(self, request, response, minify, encoding, quality):
+        content = response.content
+        if minify:
+            content = minify_html(content.decode(response.charset)).encode(response.charset)
+        if response.get('Content-Type', '').startswith('text/html'):
+            check_budget(request, response, len(content))
+        if encoding:
+            content = compress(content, encoding, quality)
+        return content
+
+    def set_encoding(self, response, encoding):
+        response['Content-Encoding'] = encoding
+        # The compressed body is a different representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
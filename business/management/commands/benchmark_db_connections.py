@@ -0,0 +1,133 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+
+# Environment of each connection mode
+MODES = {
+    'none': {'CONN_MAX_AGE': '0', 'DB_POOL': 'False'},
+    'persistent': {'CONN_MAX_AGE': '600', 'DB_POOL': 'False', 'CONN_HEALTH_CHECKS': 'True'},
+    'unchecked': {'CONN_MAX_AGE': '600', 'DB_POOL': 'False', 'CONN_HEALTH_CHECKS': 'False'},
+    'pool': {'DB_POOL': 'True', 'CONN_HEALTH_CHECKS': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request connection overhead with no, persistent and pooled Postgres connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='/api/api/search/?q=kit', help='Path to request')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode (default: 500)')
+        parser.add_argument(
+            '--modes', default='none,persistent,pool',
+            help=f"Comma-separated modes out of {', '.join(MODES)} (default: none,persistent,pool)",
+        )
+        parser.add_argument(
+            '--terminate-every', type=int, default=0,
+            help='Terminate every other connection to the database after this many requests, '
+                 'as a Postgres restart would (default: never)',
+        )
+        # Used by the parent to run one mode in a new process
+        parser.add_argument('--child', action='store_true', help='Run one measurement (internal)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Connection pooling needs PostgreSQL; set DATABASE_URL to a Postgres database')
+        if options['child']:
+            self.measure(options)
+            return
+
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'mode':<12} {'mean':>9} {'p95':>9} {'opened':>7} {'errors':>7}")
+        for mode in modes:
+            result = self.run_child(mode, options)
+            self.stdout.write(
+                f"{mode:<12} {result['mean']:>7.2f}ms {result['p95']:>7.2f}ms "
+                f"{result['opened']:>7} {result['errors']:>7}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {options['requests']} requests per mode to {options['path']}; "
+            f"'opened' counts new server connections"
+        ))
+
+    def run_child(self, mode, options):
+        output = subprocess.run(
+            [
+                sys.executable, sys.argv[0], 'benchmark_db_connections', options['path'], '--child',
+                '--requests', str(options['requests']), '--terminate-every', str(options['terminate_every']),
+            ],
+            env={**os.environ, **MODES[mode]}, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def measure(self, options):
+        created = []
+
+        def count(sender, connection, **kwargs):
+            created.append(connection.alias)
+
+        connection_created.connect(count)
+
+        # The test client keeps connections open across requests; a real
+        # handler opens and closes them as a server's requests do
+        handler = WSGIHandler()
+        factory = RequestFactory(SERVER_NAME='localhost')
+
+        def get(path):
+            response = handler(factory.get(path).environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            return response.status_code
+
+        get(options['path'])
+        created.clear()
+        latencies = []
+        errors = 0
+        for number in range(1, options['requests'] + 1):
+            started = time.perf_counter()
+            try:
+                status = get(options['path'])
+            except OperationalError:
+                status = None
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                errors += 1
+            if options['terminate_every'] and number % options['terminate_every'] == 0:
+                terminate_connections()
+
+        pool = connection.pool
+        self.stdout.write(json.dumps({
+            'mean': statistics.mean(latencies),
+            'p95': statistics.quantiles(latencies, n=20)[18],
+            # Pooled checkouts also send connection_created
+            'opened': pool.get_stats().get('connections_num', 0) if pool else len(created),
+            'errors': errors,
+        }))
+
+
+def terminate_connections():
+    """Close every other connection to the database from the server side"""
+    import psycopg
+
+    settings_dict = connection.settings_dict
+    with psycopg.connect(
+        dbname=settings_dict['NAME'], user=settings_dict['USER'], password=settings_dict['PASSWORD'],
+        host=settings_dict['HOST'], port=settings_dict['PORT'] or None, autocommit=True,
+    ) as admin:
+        admin.execute(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+        )
@@ -0,0 +1,64 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from business.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = 'Measure first-request latency of fresh processes with and without template warm-up'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=['/', '/products/', '/contact/'],
+            help='Paths to request (default: /, /products/, /contact/)',
+        )
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per path and mode (default: 5)')
+        # Used by the parent to run a single measurement in a new process
+        parser.add_argument('--child', choices=['cold', 'warm'], help='Run one measurement (internal)')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.measure(options['urls'][0], warm=options['child'] == 'warm')
+            return
+
+        self.stdout.write(f"{'path':<20} {'cold':>10} {'warm':>10} {'warm-up':>10}")
+        for url in options['urls']:
+            results = {'cold': [], 'warm': []}
+            for _ in range(options['runs']):
+                # Alternate modes so both see the same conditions
+                for mode in results:
+                    results[mode].append(self.run_child(url, mode))
+            cold = statistics.median(result['first_request'] for result in results['cold'])
+            warm = statistics.median(result['first_request'] for result in results['warm'])
+            warm_up = statistics.median(result['warm_up'] for result in results['warm'])
+            self.stdout.write(f"{url:<20} {cold:>8.1f}ms {warm:>8.1f}ms {warm_up:>8.1f}ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Medians of {options['runs']} fresh processes per path; warm-up runs once per worker at startup"
+        ))
+
+    def run_child(self, url, mode):
+        output = subprocess.run(
+            [sys.executable, sys.argv[0], 'benchmark_first_request', url, '--child', mode],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def measure(self, url, warm):
+        warm_up = 0.0
+        if warm:
+            warm_up = warm_templates()[1] * 1000
+        client = Client()
+        started = time.perf_counter()
+        response = client.get(url)
+        first_request = (time.perf_counter() - started) * 1000
+        self.stdout.write(json.dumps({
+            'status': response.status_code,
+            'first_request': first_request,
+            'warm_up': warm_up,
+        }))
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_servers import fetch, free_port, wait_until_ready
+
+
+# Environment of each profile, on top of gunicorn.conf.py's defaults
+PROFILES = {
+    'preload': {'GUNICORN_PRELOAD': 'True'},
+    'no-preload': {'GUNICORN_PRELOAD': 'False'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure startup time and memory per worker of gunicorn.conf.py with and without preloading'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/', '/products/', '/api/api/search/?q=kit'],
+            help='Paths requested after startup (default: home, products and a search)',
+        )
+        parser.add_argument('--profiles', default='no-preload,preload', help='Profiles to compare (default: both)')
+        parser.add_argument('--worker-class', default='gthread', choices=['gthread', 'uvicorn'])
+        parser.add_argument('--workers', type=int, default=4, help='Workers per server (default: 4)')
+        parser.add_argument('--requests', type=int, default=200, help='Requests before measuring again (default: 200)')
+        parser.add_argument('--no-warm', action='store_true', help='Set GUNICORN_WARM_CACHES=False')
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('Measuring shared memory needs Linux /proc/<pid>/smaps_rollup')
+        profiles = [profile.strip() for profile in options['profiles'].split(',') if profile.strip()]
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(
+            f"{options['workers']} {options['worker_class']} workers; memory in MB, "
+            f"per worker as the mean, total PSS including the master"
+        )
+        self.stdout.write(
+            f"{'profile':<12} {'when':<7} {'first':>7} {'ready':>7} {'master':>7} "
+            f"{'RSS':>7} {'PSS':>7} {'USS':>7} {'total':>7}"
+        )
+        for profile in profiles:
+            for row in self.measure(profile, options):
+                self.stdout.write(row)
+        self.stdout.write(self.style.SUCCESS(
+            "✓ 'first' is the first response, 'ready' when every worker has finished starting; "
+            "PSS splits shared pages between the processes sharing them, USS counts a worker's own"
+        ))
+
+    def measure(self, profile, options):
+        port = free_port()
+        env = {
+            **os.environ, **PROFILES[profile],
+            'PORT': str(port),
+            'GUNICORN_WORKER_CLASS': options['worker_class'],
+            'WEB_CONCURRENCY': str(options['workers']),
+            'GUNICORN_WARM_CACHES': str(not options['no_warm']),
+        }
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env, start_new_session=True,
+        )
+        try:
+            asyncio.run(wait_until_ready(port, options['paths'][0]))
+            first = time.perf_counter() - started
+            wait_until_settled(process.pid, options['workers'])
+            ready = time.perf_counter() - started
+            rows = [self.row(profile, 'started', first, ready, process.pid)]
+
+            async def load():
+                for number in range(options['requests']):
+                    await fetch(port, options['paths'][number % len(options['paths'])])
+
+            asyncio.run(load())
+            rows.append(self.row(profile, 'loaded', None, None, process.pid))
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+        return rows
+
+    def row(self, profile, when, first, ready, master_pid):
+        master = memory(master_pid)
+        workers = [memory(pid) for pid in children(master_pid)]
+        mean = {key: statistics.mean(worker[key] for worker in workers) for key in ('rss', 'pss', 'uss')}
+        total = master['pss'] + sum(worker['pss'] for worker in workers)
+        timing = f"{first:>6.1f}s {ready:>6.1f}s" if first is not None else f"{'':>7} {'':>7}"
+        return (
+            f"{profile:<12} {when:<7} {timing} {master['rss']:>7.1f} "
+            f"{mean['rss']:>7.1f} {mean['pss']:>7.1f} {mean['uss']:>7.1f} {total:>7.1f}"
+        )
+
+
+def children(pid):
+    """Pids of the direct children of ``pid``"""
+    found = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    # The parent pid follows the parenthesised command name
+                    fields = stat.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == pid:
+                found.append(int(entry))
+    return found
+
+
+def cpu_seconds(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])
+    return total / os.sysconf('SC_CLK_TCK')
+
+
+def wait_until_settled(master_pid, workers, timeout=120):
+    """Wait for ``workers`` children that have stopped using CPU, i.e. finished starting"""
+    deadline = time.monotonic() + timeout
+    previous = None
+    while time.monotonic() < deadline:
+        pids = children(master_pid)
+        used = cpu_seconds([master_pid, *pids])
+        if len(pids) >= workers and used == previous:
+            return
+        previous = used
+        time.sleep(0.5)
+    raise CommandError(f"Workers didn't settle within {timeout}s")
+
+
+def memory(pid):
+    """Resident, proportional and unique set size of ``pid`` in MB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'uss': values['Private_Clean'] + values['Private_Dirty'],
+    }
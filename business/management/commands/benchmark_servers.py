@@ -0,0 +1,172 @@
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput of the WSGI (gunicorn gthread) and ASGI (uvicorn) servers under concurrent connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/api/api/search/?q=kit', '/api/api/search/?q=chocolate'],
+            help='Paths requested in turn (default: two product searches)',
+        )
+        parser.add_argument('--servers', default='wsgi,asgi', help='Servers to compare (default: wsgi,asgi)')
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes per server (default: 2)')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per WSGI worker (default: 4)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent connections (default: 50)')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server (default: 2000)')
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Extra connections that send their request one byte a second for the whole run (default: 0)',
+        )
+
+    def server_command(self, server, port, options):
+        bind = f'127.0.0.1:{port}'
+        if server == 'wsgi':
+            return [
+                sys.executable, '-m', 'gunicorn', 'setting.wsgi:application', '--bind', bind,
+                '--worker-class', 'gthread', '--workers', str(options['workers']),
+                '--threads', str(options['threads']), '--log-level', 'warning',
+            ]
+        if server == 'asgi':
+            return [
+                sys.executable, '-m', 'uvicorn', 'setting.asgi:application', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(options['workers']), '--lifespan', 'off',
+                '--no-access-log', '--log-level', 'warning',
+            ]
+        raise CommandError(f"Unknown server {server!r}; use wsgi or asgi")
+
+    def handle(self, *args, **options):
+        servers = [server.strip() for server in options['servers'].split(',') if server.strip()]
+        self.stdout.write(
+            f"{options['concurrency']} connections, {options['slow_clients']} slow clients, "
+            f"{options['workers']} workers ({options['threads']} threads each for WSGI)"
+        )
+        self.stdout.write(f"{'server':<8} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+        for server in servers:
+            port = free_port()
+            process = subprocess.Popen(
+                self.server_command(server, port, options),
+                cwd=settings.BASE_DIR, env=os.environ.copy(), start_new_session=True,
+            )
+            try:
+                asyncio.run(wait_until_ready(port, options['paths'][0]))
+                result = asyncio.run(run_load(port, options))
+            finally:
+                # Stop the server and the workers it forked
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait()
+            self.stdout.write(
+                f"{server:<8} {result['throughput']:>8.0f} {result['p50']:>7.1f}ms {result['p95']:>7.1f}ms "
+                f"{result['p99']:>7.1f}ms {result['errors']:>7}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"✓ {options['requests']} requests per server over {', '.join(options['paths'])}"))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request_bytes(path):
+    return (
+        f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: br, gzip\r\nConnection: close\r\n\r\n"
+    ).encode()
+
+
+async def fetch(port, path):
+    """Status code of a GET over a new connection"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(request_bytes(path))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def wait_until_ready(port, path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await fetch(port, path)
+            return
+        except (OSError, IndexError, ValueError):
+            if time.monotonic() > deadline:
+                raise CommandError(f"Server on port {port} didn't start within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def slow_client(port, path, stop):
+    """Hold a connection open, trickling a request the server has to wait for"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return
+    try:
+        for byte in request_bytes(path):
+            if stop.is_set():
+                break
+            writer.write(bytes([byte]))
+            await writer.drain()
+            try:
+                await asyncio.wait_for(stop.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_load(port, options):
+    paths = options['paths']
+    # Warm every worker's caches before measuring
+    await asyncio.gather(*(fetch(port, path) for path in paths * options['workers'] * 2))
+
+    stop = asyncio.Event()
+    slow = [asyncio.create_task(slow_client(port, paths[0], stop)) for _ in range(options['slow_clients'])]
+    await asyncio.sleep(0.5 if slow else 0)
+
+    remaining = iter(range(options['requests']))
+    latencies = []
+    errors = 0
+
+    async def connection():
+        nonlocal errors
+        for number in remaining:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(port, paths[number % len(paths)]), 30)
+            except (OSError, IndexError, ValueError, asyncio.TimeoutError):
+                status = None
+            if status == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(options['concurrency'])))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*slow)
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': quantiles[49],
+        'p95': quantiles[94],
+        'p99': quantiles[98],
+        'errors': errors,
+    }
@@ -0,0 +1,60 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from wagtail.models import Page
+
+from business.critical_css import FOLD_ELEMENTS, AboveTheFold, extract_critical_css, stylesheet_path
+from business.models import Product, ProductsPage
+
+
+class Command(BaseCommand):
+    help = 'Derive the inlined critical CSS of each page type from rendered pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fold-elements', type=int, default=FOLD_ELEMENTS,
+            help=f'Elements of the main content counted as above the fold (default: {FOLD_ELEMENTS})',
+        )
+
+    def sample_urls(self):
+        """One live page of each type, and a product detail page"""
+        urls = {}
+        for page in Page.objects.live().filter(depth__gt=1).specific():
+            urls.setdefault(type(page), page.url)
+        products_page = ProductsPage.objects.live().first()
+        product = Product.objects.filter(is_active=True).first()
+        if products_page and product:
+            urls['product_detail'] = f"{products_page.url}{product.slug}/"
+        return [url for url in urls.values() if url]
+
+    def handle(self, *args, **options):
+        client = Client(SERVER_NAME='localhost')
+        pages = defaultdict(list)
+        for url in self.sample_urls():
+            response = client.get(url)
+            if response.status_code != 200:
+                self.stdout.write(self.style.WARNING(f"Skipped {url}: {response.status_code}"))
+                continue
+            parser = AboveTheFold(options['fold_elements'])
+            parser.feed(response.content.decode())
+            if parser.page_type:
+                pages[parser.page_type].append((url, parser))
+
+        directory = settings.BASE_DIR / 'static' / 'critical'
+        directory.mkdir(exist_ok=True)
+        for page_type, parsed in sorted(pages.items()):
+            classes = set().union(*(parser.classes for url, parser in parsed))
+            ids = set().union(*(parser.ids for url, parser in parsed))
+            css = ''
+            for href in parsed[0][1].stylesheets:
+                with open(stylesheet_path(href), encoding='utf-8') as f:
+                    css += f.read() + '\n'
+            critical = extract_critical_css(css, classes, ids)
+            (directory / f'{page_type}.css').write_text(critical, encoding='utf-8')
+            self.stdout.write(
+                f"{page_type:<20} {parsed[0][0]:<30} {len(css.encode()):>7} bytes of CSS, "
+                f"{len(critical.encode()):>6} inlined"
+            )
+        self.stdout.write(self.style.SUCCESS(f"✓ Critical CSS written for {len(pages)} page types"))
@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from business.catalogue import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_rows, iter_csv, iter_gzip,
+    iter_jsonl, write_xlsx
+)
+
+
+class Command(BaseCommand):
+    help = 'Export the product catalogue as CSV, JSON lines or an .xlsx workbook'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=sorted(EXPORT_FORMATS), default='csv',
+            help="Output format (default: csv)"
+        )
+        parser.add_argument(
+            '--output', '-o',
+            help="File to write to (default: stdout, not available for xlsx)"
+        )
+        parser.add_argument('--gzip', action='store_true', help="Gzip CSV or JSON lines output")
+        parser.add_argument('--all', action='store_true', help="Include inactive products")
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help=f"Rows fetched per database round trip (default: {EXPORT_CHUNK_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        output = options['output']
+        rows = export_rows(include_inactive=options['all'], chunk_size=options['chunk_size'])
+
+        if export_format == 'xlsx':
+            if not output:
+                raise CommandError("--output is required for xlsx exports.")
+            write_xlsx(rows, output)
+        else:
+            chunks = iter_csv(rows) if export_format == 'csv' else iter_jsonl(rows)
+            if options['gzip']:
+                chunks = iter_gzip(chunks)
+            file = open(output, 'wb') if output else sys.stdout.buffer
+            try:
+                for chunk in chunks:
+                    file.write(chunk)
+            finally:
+                if output:
+                    file.close()
+                else:
+                    file.flush()
+
+        if output:
+            self.stderr.write(self.style.SUCCESS(f"✓ Exported catalogue to {output}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from business.catalogue import CatalogueImporter, CatalogueImportError
+
+
+class Command(BaseCommand):
+    help = 'Import or update products from an .xlsx spreadsheet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the .xlsx workbook")
+        parser.add_argument('--sheet', help="Worksheet name (default: the active sheet)")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Rows upserted per batch (default: 1000)"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Print the changes without writing anything"
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # The full diff is always shown for dry runs, otherwise only with -v 2
+        write = self.stdout.write if dry_run or options['verbosity'] > 1 else None
+        importer = CatalogueImporter(
+            dry_run=dry_run,
+            batch_size=options['batch_size'],
+            write=write,
+        )
+
+        try:
+            stats = importer.run(options['path'], sheet=options['sheet'])
+        except (CatalogueImportError, OSError) as e:
+            raise CommandError(str(e))
+
+        summary = (
+            f"{stats['created']} created, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['skipped']} skipped"
+        )
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"Dry run, nothing saved: {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✓ Imported catalogue: {summary}"))
@@ -0,0 +1,110 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.utils import timezone
+from wagtail.search.backends import get_search_backend
+from wagtail.search.index import get_indexed_models
+from wagtail.search.management.commands.update_index import group_models_by_index
+
+from business.models import SearchIndexUpdate
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the search index like Wagtail's update_index, indexing chunks of objects "
+        "in parallel worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help='Search backend to rebuild (default: all)')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes; 1 indexes in this process (default: one per CPU)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Objects per chunk (default: 1000)')
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        backend_names = [options['backend']] if options['backend'] else list(settings.WAGTAILSEARCH_BACKENDS)
+        for backend_name in backend_names:
+            self.rebuild(backend_name, options)
+        # The rebuild covers every update queued before it started
+        cleared, _ = SearchIndexUpdate.objects.filter(queued_at__lte=started).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Rebuilt {', '.join(backend_names)} with {options['workers']} workers; "
+            f"cleared {cleared} queued updates"
+        ))
+
+    def rebuild(self, backend_name, options):
+        backend = get_search_backend(backend_name)
+        if not backend.rebuilder_class:
+            self.stdout.write(f"{backend_name}: doesn't need rebuilding")
+            return
+        if backend.rebuilder_class is getattr(backend, 'atomic_rebuilder_class', None):
+            # Workers can't join the rebuilder's transaction
+            raise CommandError(f"{backend_name} uses ATOMIC_REBUILD; rebuild it with update_index instead")
+
+        for index, models in group_models_by_index(backend, get_indexed_models()).items():
+            started = time.perf_counter()
+            rebuilder = backend.rebuilder_class(index)
+            index = rebuilder.start()
+            for model in models:
+                index.add_model(model)
+
+            chunks = [
+                (backend_name, model._meta.label, first, last)
+                for model in models
+                for first, last in pk_ranges(model, options['chunk_size'])
+            ]
+            counts = dict.fromkeys((model._meta.label for model in models), 0)
+            for label, count in self.index_chunks(chunks, options['workers']):
+                counts[label] += count
+
+            rebuilder.finish()
+            for label, count in counts.items():
+                if count:
+                    self.stdout.write(f"  {label:<30} {count:>8}")
+            self.stdout.write(
+                f"{backend_name}: indexed {sum(counts.values())} objects into {index} "
+                f"in {len(chunks)} chunks, {time.perf_counter() - started:.1f}s"
+            )
+
+    def index_chunks(self, chunks, workers):
+        if workers <= 1:
+            return map(index_chunk, chunks)
+        # Forked workers open their own connections; they mustn't share ours
+        connections.close_all()
+        with ProcessPoolExecutor(min(workers, len(chunks) or 1), initializer=django.setup) as pool:
+            return list(pool.map(index_chunk, chunks))
+
+
+def pk_ranges(model, size):
+    """First and last primary key of each run of ``size`` indexed objects"""
+    pks = list(model.get_indexed_objects().order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), size):
+        chunk = pks[start:start + size]
+        yield chunk[0], chunk[-1]
+
+
+def index_chunk(chunk):
+    """Index the objects of one chunk; runs in a worker process"""
+    backend_name, label, first, last = chunk
+    model = apps.get_model(label)
+    objects = list(model.get_indexed_objects().filter(pk__gte=first, pk__lte=last).order_by('pk'))
+    index = get_search_backend(backend_name).get_index_for_model(model)
+    for attempt in range(3):
+        try:
+            index.add_items(model, objects)
+            break
+        except OperationalError:
+            # Workers updating each other's new entries (e.g. title norms on
+            # PostgreSQL) can deadlock; writing a chunk again is harmless
+            if attempt == 2:
+                raise
+    return label, len(objects)
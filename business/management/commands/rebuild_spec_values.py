@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from business.catalogue import rebuild_spec_values
+
+
+class Command(BaseCommand):
+    help = 'Recompute the distinct specification values listed by /api/specs/'
+
+    def handle(self, *args, **options):
+        values = rebuild_spec_values()
+        self.stdout.write(self.style.SUCCESS(f"✓ {values} specification values across active products"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils.text import capfirst
+
+from business.catalogue import reconcile_product_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute active product counts on categories, brands and partners'
+
+    def handle(self, *args, **options):
+        corrected = reconcile_product_counts()
+        for model, rows in corrected.items():
+            self.stdout.write(f"{capfirst(model._meta.verbose_name_plural)}: {rows} corrected")
+        self.stdout.write(self.style.SUCCESS("✓ Product counts reconciled"))
@@ -0,0 +1,100 @@
+import os
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from business.static_assets import IMAGE_VARIANTS, WhiteNoiseMiddleware
+
+
+class StaticAssets(HTMLParser):
+    """Static URLs a browser fetches for a page, taking the first <source> of each <picture>"""
+
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+        self.picture = None
+
+    def add(self, url):
+        if url and url.startswith(settings.STATIC_URL) and url not in self.urls:
+            self.urls.append(url)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'picture':
+            self.picture = []
+        elif tag == 'source' and self.picture is not None:
+            self.picture.append(attrs.get('srcset'))
+        elif tag == 'img':
+            self.add(self.picture[0] if self.picture else attrs.get('src'))
+        elif tag == 'script':
+            self.add(attrs.get('src'))
+        elif tag == 'link' and attrs.get('rel') in ('stylesheet', 'preload', 'icon'):
+            self.add(attrs.get('href'))
+
+    def handle_endtag(self, tag):
+        if tag == 'picture':
+            self.picture = None
+
+
+class Command(BaseCommand):
+    help = 'Compare the static bytes a cold page load transfers with the source files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?', default='/', help='Page to load (default: /)')
+        parser.add_argument(
+            '--accept-encoding', default='gzip, deflate, br, zstd',
+            help='Encodings the browser accepts (default: "gzip, deflate, br, zstd")',
+        )
+
+    def source_size(self, name):
+        """Size of the source file ``name`` was built from, before this pipeline"""
+        path = finders.find(name)
+        if path is None:
+            # An image variant; the page used to ship the original image
+            path = finders.find(re.sub(r'\.(%s)$' % '|'.join(IMAGE_VARIANTS), '', name))
+        return os.path.getsize(path) if path else None
+
+    def served_size(self, hashed_name, accepted):
+        path = staticfiles_storage.path(hashed_name)
+        sizes = [os.path.getsize(path)]
+        for encoding, suffix in WhiteNoiseMiddleware.ENCODINGS.items():
+            if encoding in accepted and os.path.exists(path + suffix):
+                sizes.append(os.path.getsize(path + suffix))
+        return min(sizes)
+
+    def handle(self, *args, **options):
+        hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+        if not hashed_files:
+            raise CommandError('No static files manifest; run collectstatic with the production settings first')
+        originals = {hashed: name for name, hashed in hashed_files.items()}
+        accepted = {encoding.strip().split(';')[0] for encoding in options['accept_encoding'].split(',')}
+
+        response = Client(SERVER_NAME='localhost').get(options['url'])
+        parser = StaticAssets()
+        parser.feed(response.content.decode())
+
+        total_before = total_after = 0
+        self.stdout.write(f"{'asset':<40} {'source':>10} {'served':>10}")
+        for url in parser.urls:
+            hashed_name = url.removeprefix(settings.STATIC_URL)
+            name = originals.get(hashed_name)
+            if name is None:
+                self.stdout.write(self.style.WARNING(f"{hashed_name:<40} not in the manifest"))
+                continue
+            before = self.source_size(name)
+            after = self.served_size(hashed_name, accepted)
+            total_before += before or after
+            total_after += after
+            self.stdout.write(f"{name:<40} {before or '-':>10} {after:>10}")
+
+        saved = total_before - total_after
+        percent = saved / total_before * 100 if total_before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {options['url']}: {len(parser.urls)} static files, {total_before:,} -> {total_after:,} bytes "
+            f"({saved:,} saved, {percent:.0f}%)"
+        ))
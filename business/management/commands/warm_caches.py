@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from business.warmup import site_targets, warm_site, warm_templates
+
+
+class Command(BaseCommand):
+    help = 'Render every live page, common category listings and the API lists to warm caches after a deploy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Requests in flight at once (default: 4)')
+        parser.add_argument(
+            '--categories', type=int, default=10,
+            help='Category listings per products page, busiest first (default: 10)',
+        )
+        parser.add_argument('--no-api', action='store_true', help="Don't fetch the API lists")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        templates, _ = warm_templates()
+        targets = site_targets(categories=options['categories'], api=not options['no_api'])
+        results = warm_site(targets, concurrency=options['concurrency'])
+
+        self.stdout.write(f"{'status':>6} {'time':>9}  url")
+        for host, path, status, milliseconds in results:
+            self.stdout.write(f"{status or 'error':>6} {milliseconds:>7.1f}ms  {host}{path}")
+
+        failed = [result for result in results if result[2] != 200]
+        slowest = max(results, key=lambda result: result[3], default=None)
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{len(failed)} URLs didn't return 200"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Warmed {templates} templates and {len(results)} URLs in "
+            f"{time.perf_counter() - started:.1f}s with concurrency {options['concurrency']}"
+            + (f"; slowest {slowest[0]}{slowest[1]} at {slowest[3]:.0f}ms" if slowest else "")
+        ))
@@ -0,0 +1,66 @@
+"""
+Runtime metrics of the worker process serving the request.
+
+Database pools and in-process caches belong to one worker, so
+``/_util/metrics/`` reports the numbers of whichever worker answers, with
+its pid; poll it a few times to see them all. Other modules add to the
+report with ``register``::
+
+    register('search_cache', search_cache.stats)
+"""
+import os
+import resource
+
+from django.db import connections
+from django.http import JsonResponse
+
+
+sources = {}
+
+
+def register(name, function):
+    """Include ``function()`` in the metrics report as ``name``"""
+    sources[name] = function
+
+
+def database_stats():
+    """Pool usage of each pooled database, or its connection settings"""
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            stats[alias] = {'pooled': True, **pool.get_stats()}
+        else:
+            stats[alias] = {
+                'pooled': False,
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+            }
+    return stats
+
+
+def process_stats():
+    """Resident memory of this worker in MB, now and at its peak"""
+    stats = {'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    try:
+        with open('/proc/self/statm') as statm:
+            stats['rss_mb'] = round(int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except OSError:
+        # Not Linux
+        pass
+    return stats
+
+
+register('databases', database_stats)
+register('process', process_stats)
+
+
+def metrics(request):
+    """Metrics of this worker as JSON, for staff"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    report = {'pid': os.getpid()}
+    for name, function in sources.items():
+        report[name] = function()
+    return JsonResponse(report)
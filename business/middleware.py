@@ -0,0 +1,162 @@
+"""
+Cookie-less fast path for anonymous visitors.
+
+Public pages and the read-only API don't need a session, a user or flash
+messages when the visitor has no session cookie. FastPathMiddleware marks
+those requests, and the session, authentication and message middleware
+below (drop-in subclasses of Django's) skip their work for them. Nothing
+then touches the session, so responses don't get ``Vary: Cookie`` and can
+be marked publicly cacheable.
+
+The project's own middleware works under both WSGI and ASGI without
+being adapted, so async views such as product_search run on the event
+loop rather than in a thread per request. Under ASGI, Django's middleware
+runs each process_request and process_response in a thread; the
+subclasses here skip that for fast path requests, where they do no I/O.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.middleware import MessageMiddleware as BaseMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.utils.cache import patch_cache_control
+
+
+def is_fast_path(request):
+    return getattr(request, 'fast_path', False)
+
+
+class HybridMiddleware:
+    """
+    Middleware that runs the same way under WSGI and ASGI.
+
+    Subclasses implement ``process_request`` and ``process_response``.
+    Unlike Django's MiddlewareMixin, these are called directly in async
+    mode instead of in a thread, so they must not do I/O.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        pass
+
+    def process_response(self, request, response):
+        return response
+
+
+class FastPathMiddleware(HybridMiddleware):
+    """
+    Flag anonymous GET and HEAD requests outside the admin as fast path,
+    and let shared caches keep what they return.
+    """
+
+    # Served with full session, auth and messages behaviour
+    excluded_prefixes = ('/admin/', '/django-admin/', '/documents/', '/_util/')
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'PUBLIC_FAST_PATH', False)
+        self.cache_seconds = getattr(settings, 'PUBLIC_CACHE_SECONDS', 300)
+
+    def process_request(self, request):
+        request.fast_path = self.enabled and self.is_public(request)
+
+    def process_response(self, request, response):
+        if request.fast_path and self.is_shareable(response):
+            patch_cache_control(response, public=True, max_age=self.cache_seconds)
+        return response
+
+    def is_public(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and 'messages' not in request.COOKIES
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and not request.path_info.startswith(self.excluded_prefixes)
+        )
+
+    def is_shareable(self, response):
+        """Successful responses nobody has set cookies or caching rules on"""
+        return (
+            response.status_code == 200
+            and not response.cookies
+            and not response.has_header('Cache-Control')
+            and 'cookie' not in response.get('Vary', '').lower()
+        )
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    """Hand fast path requests an empty session that is never loaded or saved"""
+
+    def process_request(self, request):
+        if is_fast_path(request):
+            request.session = self.SessionStore()
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        # A view that does store something still gets its session saved
+        if is_fast_path(request) and not request.session.modified:
+            return response
+        return super().process_response(request, response)
+
+    async def __acall__(self, request):
+        if not is_fast_path(request):
+            return await super().__acall__(request)
+        self.process_request(request)
+        response = await self.get_response(request)
+        if request.session.modified:
+            return await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+        return response
+
+
+class AuthenticationMiddleware(BaseAuthenticationMiddleware):
+    """Fast path requests are anonymous without looking at the session"""
+
+    def process_request(self, request):
+        if is_fast_path(request):
+            request.user = AnonymousUser()
+            request.auser = self.anonymous_user
+        else:
+            super().process_request(request)
+
+    @staticmethod
+    async def anonymous_user():
+        return AnonymousUser()
+
+    async def __acall__(self, request):
+        if not is_fast_path(request):
+            return await super().__acall__(request)
+        self.process_request(request)
+        return await self.get_response(request)
+
+
+class MessageMiddleware(BaseMessageMiddleware):
+    """No message storage on the fast path; templates see no messages"""
+
+    def process_request(self, request):
+        if not is_fast_path(request):
+            super().process_request(request)
+
+    async def __acall__(self, request):
+        # Without request._messages, process_response has nothing to store
+        if not is_fast_path(request):
+            return await super().__acall__(request)
+        return await self.get_response(request)
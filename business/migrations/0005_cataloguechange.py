@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:28
+
+from django.db import migrations, models
+
+
+def backfill_changes(apps, schema_editor):
+    """Log the existing catalogue as inserts so a sync from cursor 0 sees it"""
+    CatalogueChange = apps.get_model('business', 'CatalogueChange')
+    for model_name in ['productcategory', 'partner', 'brand', 'product']:
+        model = apps.get_model('business', model_name)
+        CatalogueChange.objects.bulk_create(
+            [
+                CatalogueChange(model=model_name, object_id=object_id, action='insert')
+                for object_id in model.objects.order_by('pk').values_list('pk', flat=True)
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0004_partner_remove_brand_logo_remove_product_image_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], max_length=6)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
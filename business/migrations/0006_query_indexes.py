@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:29
+
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyIfPostgres(AddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL, a plain CREATE INDEX elsewhere"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, and doesn't
+    # lock the tables against writes while the indexes build.
+    atomic = False
+
+    dependencies = [
+        ('business', '0005_cataloguechange'),
+        ('wagtailimages', '0027_image_description'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='brand',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='brand_name_upper_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='partner',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order', 'name'], name='partner_active_order_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='product_active_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-created_at'], name='product_active_category_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['-created_at'], name='product_featured_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='productcategory',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='category_name_upper_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='teammember',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order', 'name'], name='teammember_active_order_idx'),
+        ),
+    ]
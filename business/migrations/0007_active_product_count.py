@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_products(apps, schema_editor):
+    Product = apps.get_model('business', 'Product')
+    active = Product.objects.filter(is_active=True).order_by()
+    for model_name, lookup in [
+        ('productcategory', 'category'),
+        ('brand', 'brand'),
+        ('partner', 'brand__partner'),
+    ]:
+        model = apps.get_model('business', model_name)
+        counts = active.filter(**{lookup: OuterRef('pk')}).values(lookup).annotate(n=Count('pk')).values('n')
+        model.objects.update(active_product_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Active products of this brand, kept up to date automatically'),
+        ),
+        migrations.AddField(
+            model_name='partner',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Active products across this partner's brands, kept up to date automatically"),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Active products in this category, kept up to date automatically'),
+        ),
+        migrations.RunPython(count_active_products, migrations.RunPython.noop),
+    ]
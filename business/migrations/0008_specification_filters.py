@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:36
+
+import json
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def build_spec_values(apps, schema_editor):
+    Product = apps.get_model('business', 'Product')
+    ProductSpecValue = apps.get_model('business', 'ProductSpecValue')
+    counts = Counter()
+    for specifications in Product.objects.filter(is_active=True).values_list('specifications', flat=True):
+        for key, value in (specifications or {}).items():
+            if isinstance(value, (dict, list)) or value is None:
+                continue
+            text = value if isinstance(value, str) else json.dumps(value)
+            if len(key) <= 100 and len(text) <= 255:
+                counts[key, text] += 1
+    ProductSpecValue.objects.bulk_create(
+        [ProductSpecValue(key=key, value=value, product_count=n) for (key, value), n in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    # The GIN index on Product.specifications is built concurrently, outside
+    # a transaction, by 0012_product_specs_gin_idx
+
+    dependencies = [
+        ('business', '0007_active_product_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSpecValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['key', 'value'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productspecvalue',
+            constraint=models.UniqueConstraint(fields=('key', 'value'), name='unique_spec_value'),
+        ),
+        migrations.RunPython(build_spec_values, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models.functions import Upper
 from wagtail.models import Page, Orderable
 from wagtail.fields import RichTextField, StreamField
 from wagtail.admin.panels import (
@@ -7,16 +9,27 @@ from wagtail.admin.panels import (
 from wagtail.images.models import Image
 from wagtail.images import get_image_model_string
 from wagtail.snippets.models import register_snippet
+from wagtail.contrib.routable_page.models import RoutablePageMixin, path
 from wagtail.search import index
 from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from django.core.validators import RegexValidator
+from django.http import Http404, HttpResponse, QueryDict
+from django.template.response import TemplateResponse
+from django.utils.cache import patch_cache_control
 from django.utils.functional import cached_property
 from wagtail import blocks
 from wagtail.images.blocks import ImageChooserBlock
 
 from seo.models import SEOMixin
 
+from .html import minify_html
+from .versions import get_content_versions
+
 
 # Custom blocks for flexible content
 class HeroBlock(blocks.StructBlock):
@@ -88,16 +101,43 @@ class ContactBlock(blocks.StructBlock):
         label = "Contact Information"
 
 
+class ActiveProductCountMixin:
+    """
+    Saving an existing row leaves active_product_count alone.
+    
+    The count is only moved by UPDATE statements as products change
+    (business.catalogue), so an instance loaded earlier must not write back
+    the count it was loaded with.
+    """
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'active_product_count'
+            ]
+        super().save(*args, **kwargs)
+
+
 @register_snippet
-class ProductCategory(models.Model):
+class ProductCategory(ActiveProductCountMixin, models.Model):
     """Product categories for organization"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, blank=True, help_text="Icon class or emoji")
+    active_product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Active products in this category, kept up to date automatically"
+    )
     
     class Meta:
         verbose_name_plural = "Product Categories"
         ordering = ['name']
+        indexes = [
+            # name__iexact lookups compare UPPER(name) on PostgreSQL
+            models.Index(Upper('name'), name='category_name_upper_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -110,7 +150,7 @@ class ProductCategory(models.Model):
 
 
 @register_snippet
-class Partner(models.Model):
+class Partner(ActiveProductCountMixin, models.Model):
     """Partner companies - brands we import from"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
@@ -122,9 +162,21 @@ class Partner(models.Model):
     country_of_origin = models.CharField(max_length=100, blank=True)
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0, help_text="Display order")
+    active_product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Active products across this partner's brands, kept up to date automatically"
+    )
     
     class Meta:
         ordering = ['order', 'name']
+        indexes = [
+            models.Index(
+                fields=['order', 'name'],
+                condition=models.Q(is_active=True),
+                name='partner_active_order_idx',
+            ),
+        ]
         verbose_name = "Business Partner"
         verbose_name_plural = "Business Partners"
     
@@ -145,7 +197,7 @@ class Partner(models.Model):
 
 
 @register_snippet
-class Brand(models.Model):
+class Brand(ActiveProductCountMixin, models.Model):
     """Brand information for products"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
@@ -163,9 +215,18 @@ class Brand(models.Model):
         blank=True,
         help_text="Which partner company owns this brand"
     )
+    active_product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Active products of this brand, kept up to date automatically"
+    )
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # name__iexact lookups compare UPPER(name) on PostgreSQL
+            models.Index(Upper('name'), name='brand_name_upper_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -180,6 +241,47 @@ class Brand(models.Model):
     ]
 
 
+def specification_values(value):
+    """
+    JSON values a query-string specification filter may match.
+    
+    Query strings only carry text, so "24" also matches the number 24 and
+    "true" the boolean true.
+    """
+    candidates = [value]
+    if value.lower() in ('true', 'false'):
+        candidates.append(value.lower() == 'true')
+    else:
+        try:
+            candidates.append(int(value))
+        except ValueError:
+            try:
+                candidates.append(float(value))
+            except ValueError:
+                pass
+    return candidates
+
+
+class ProductQuerySet(models.QuerySet):
+    
+    def with_specifications(self, specifications):
+        """
+        Keep products whose specifications contain every key/value pair.
+        
+        On PostgreSQL this is a containment query answered by the GIN index
+        on ``specifications``; other backends fall back to key lookups.
+        """
+        for key, value in specifications.items():
+            condition = models.Q()
+            for candidate in specification_values(value):
+                if connection.features.supports_json_field_contains:
+                    condition |= models.Q(specifications__contains={key: candidate})
+                else:
+                    condition |= models.Q(**{f'specifications__{key}': candidate})
+            self = self.filter(condition)
+        return self
+
+
 @register_snippet
 class Product(index.Indexed, models.Model):
     """Individual products"""
@@ -205,6 +307,8 @@ class Product(index.Indexed, models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     search_fields = [
         index.SearchField('name', partial_match=True, boost=10),
         index.SearchField('description'),
@@ -216,10 +320,46 @@ class Product(index.Indexed, models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Active listings, newest first, optionally narrowed to a category
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_active=True),
+                name='product_active_created_idx',
+            ),
+            models.Index(
+                fields=['category', '-created_at'],
+                condition=models.Q(is_active=True),
+                name='product_active_category_idx',
+            ),
+            # Homepage featured products
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_active=True, is_featured=True),
+                name='product_featured_created_idx',
+            ),
+            # Specification filters (PostgreSQL only, see migration 0012)
+            GinIndex(
+                fields=['specifications'],
+                opclasses=['jsonb_path_ops'],
+                name='product_specs_gin_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.brand.name} - {self.name}"
     
+    def related_products(self, limit=None):
+        """Precomputed similar products, best match first"""
+        recommendations = (
+            self.recommendations.filter(related__is_active=True)
+            .select_related('related__brand', 'related__category')
+            .order_by('rank')
+        )
+        if limit:
+            recommendations = recommendations[:limit]
+        return [recommendation.related for recommendation in recommendations]
+    
     panels = [
         FieldPanel('name'),
         FieldPanel('slug'),
@@ -235,6 +375,166 @@ class Product(index.Indexed, models.Model):
     ]
 
 
+class ProductSlugIndex:
+    """
+    In-process map of active product slugs to ids for product detail routes.
+    
+    Loaded with a single query on first use. Slugs it doesn't know are
+    looked up individually and remembered, so products created by other
+    processes still resolve; product saves in this process update it.
+    """
+    
+    def __init__(self):
+        self.ids = None
+    
+    def get(self, slug):
+        ids = self.ids
+        if ids is None:
+            ids = self.ids = dict(Product.objects.filter(is_active=True).values_list('slug', 'pk'))
+        if slug not in ids:
+            pk = Product.objects.filter(slug=slug, is_active=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            ids[slug] = pk
+        return ids[slug]
+    
+    def clear(self):
+        self.ids = None
+    
+    def discard(self, slug):
+        """Forget ``slug``, e.g. after another process renamed its product"""
+        if self.ids is not None:
+            self.ids.pop(slug, None)
+    
+    def update(self, product, deleted=False):
+        """Re-point the index after ``product`` was saved or deleted"""
+        self.update_many([product], deleted)
+    
+    def update_many(self, products, deleted=False):
+        """Re-point the index after ``products`` were written or deleted in bulk"""
+        ids = self.ids
+        if ids is None:
+            return
+        pks = {product.pk for product in products}
+        for slug in [slug for slug, pk in ids.items() if pk in pks]:
+            del ids[slug]
+        if not deleted:
+            ids.update((product.slug, product.pk) for product in products if product.is_active)
+
+
+product_slugs = ProductSlugIndex()
+
+
+class ProductSpecValue(models.Model):
+    """
+    Distinct specification values across active products, with counts.
+    
+    Precomputed so filter UIs can list the choices for each specification
+    key without scanning the catalogue.
+    """
+    key = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+    product_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['key', 'value']
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'value'], name='unique_spec_value'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key}={self.value} ({self.product_count})"
+
+
+class RelatedProduct(models.Model):
+    """
+    One of a product's nearest neighbours in the catalogue.
+    
+    Written in bulk by the build_recommendations command, so showing
+    related products is a single lookup on (product, rank).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_recommendation_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank}, {self.score:.3f})"
+
+
+class CatalogueChange(models.Model):
+    """
+    Append-only log of catalogue inserts, updates and deletes.
+
+    Backs the partner change feed: the primary key is the sync cursor, so
+    entries have to become visible in id order. Writers take a transaction
+    level lock before logging, which makes commit order match id order.
+    """
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (INSERT, 'Insert'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+
+    # Arbitrary key for pg_advisory_xact_lock()
+    LOCK_ID = 7311
+
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.model} {self.object_id}"
+
+    @classmethod
+    def record(cls, model, object_ids, action):
+        """Log ``action`` for the given primary keys of ``model``"""
+        if not object_ids:
+            return
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [cls.LOCK_ID])
+            cls.objects.bulk_create([
+                cls(model=model._meta.model_name, object_id=object_id, action=action)
+                for object_id in object_ids
+            ])
+
+
+class SearchIndexUpdate(models.Model):
+    """
+    An object whose search index entry is out of date.
+
+    There is at most one row per object, so saving it again before the
+    queue is processed only moves ``queued_at``; business.search_index
+    writes the rows and indexes them in batches.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.CharField(max_length=255)
+    queued_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='unique_search_index_update'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model} {self.object_id}"
+
+
 class TeamMember(models.Model):
     """Team member information"""
     name = models.CharField(max_length=100)
@@ -262,6 +562,13 @@ class TeamMember(models.Model):
     
     class Meta:
         ordering = ['order', 'name']
+        indexes = [
+            models.Index(
+                fields=['order', 'name'],
+                condition=models.Q(is_active=True),
+                name='teammember_active_order_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.position}"
@@ -445,9 +752,23 @@ class AboutPageFeature(Orderable):
     ]
 
 
-class ProductsPage(SEOMixin, Page):
+class ProductsPage(RoutablePageMixin, SEOMixin, Page):
     """Products listing page"""
     
+    # Products per page of the product grid
+    products_per_page = 24
+    
+    # How long browsers and shared caches may keep a product grid fragment
+    grid_cache_seconds = 300
+    
+    # How long a rendered product detail page is cached server-side; saving
+    # the product, its brand or category, a related product or the SEO
+    # settings drops it sooner
+    product_cache_seconds = 3600
+    
+    # Related products shown on a product detail page
+    related_products_count = 4
+    
     introduction = RichTextField(
         blank=True,
         features=['h2', 'h3', 'bold', 'italic', 'link']
@@ -463,35 +784,148 @@ class ProductsPage(SEOMixin, Page):
     
     promote_panels = Page.promote_panels + SEOMixin.seo_panels
     
-    def get_context(self, request):
-        context = super().get_context(request)
+    def get_product_grid_context(self, request, categories, brands):
+        """
+        Filter active products by the ``category`` and ``brand`` names in the
+        query string and return the requested page of them.
         
-        # Get all categories
-        context['categories'] = ProductCategory.objects.all()
+        Names are matched against the already loaded ``categories`` and
+        ``brands`` so filtering doesn't need extra lookups.
+        """
+        context = {}
+        products = Product.objects.filter(is_active=True)
         
-        # Get products by category
-        category_slug = request.GET.get('category')
-        if category_slug:
-            try:
-                category = ProductCategory.objects.get(name__iexact=category_slug)
-                products = Product.objects.filter(
-                    category=category,
-                    is_active=True
-                ).select_related('brand', 'category')
+        category_name = request.GET.get('category', '').lower()
+        if category_name:
+            category = next((c for c in categories if c.name.lower() == category_name), None)
+            if category:
+                products = products.filter(category=category)
                 context['selected_category'] = category
-            except ProductCategory.DoesNotExist:
-                products = Product.objects.filter(
-                    is_active=True
-                ).select_related('brand', 'category')
-        else:
-            products = Product.objects.filter(
-                is_active=True
-            ).select_related('brand', 'category')
         
-        context['products'] = products
-        context['brands'] = Brand.objects.all()
+        brand_name = request.GET.get('brand', '').lower()
+        if brand_name:
+            brand = next((b for b in brands if b.name.lower() == brand_name), None)
+            if brand:
+                products = products.filter(brand=brand)
+                context['selected_brand'] = brand
+        
+        paginator = Paginator(products.select_related('brand', 'category'), self.products_per_page)
+        context['products'] = paginator.get_page(request.GET.get('page'))
+        
+        # Query string for pagination links, keeping the active filters
+        filters = QueryDict(mutable=True)
+        if 'selected_category' in context:
+            filters['category'] = context['selected_category'].name
+        if 'selected_brand' in context:
+            filters['brand'] = context['selected_brand'].name
+        context['grid_filters'] = filters.urlencode()
+        context['products_url'] = self.get_url(request)
+        context['grid_url'] = context['products_url'] + self.reverse_subpage('product_grid')
         
         return context
+    
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        
+        context['categories'] = list(ProductCategory.objects.all())
+        context['brands'] = list(Brand.objects.select_related('partner'))
+        context.update(self.get_product_grid_context(request, context['categories'], context['brands']))
+        
+        return context
+    
+    @path('grid/')
+    def product_grid(self, request):
+        """Just the product grid HTML, for filtering and paging in place"""
+        categories = list(ProductCategory.objects.all())
+        context = {'page': self, 'request': request, 'categories': categories}
+        context.update(self.get_product_grid_context(request, categories, list(Brand.objects.all())))
+        response = TemplateResponse(request, 'includes/product_grid.html', context)
+        patch_cache_control(response, public=True, max_age=self.grid_cache_seconds)
+        return response
+    
+    @staticmethod
+    def product_cache_key(page_id, product_id):
+        # Rebuilding the related products bumps the "related" version, the
+        # SEO settings feed every page's head and the page tree its header
+        versions = ':'.join(str(version) for version in get_content_versions('related', 'settings', 'pages'))
+        return f"products_page:{page_id}:product:{product_id}:{versions}"
+    
+    @classmethod
+    def invalidate_products(cls, product_ids):
+        """
+        Drop the cached detail pages of ``product_ids``, and of the products
+        showing them as related, on every products page
+        """
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        product_ids.update(
+            RelatedProduct.objects.filter(related__in=product_ids).values_list('product', flat=True)
+        )
+        page_ids = list(cls.objects.values_list('pk', flat=True))
+        cache.delete_many([
+            cls.product_cache_key(page_id, product_id)
+            for page_id in page_ids for product_id in product_ids
+        ])
+    
+    @classmethod
+    def refresh_products(cls, products):
+        """
+        Bring the slug index and detail pages up to date after ``products``
+        were written with bulk_create() or bulk_update(), which send none of
+        the signals that normally do it
+        """
+        product_slugs.update_many(products)
+        cls.invalidate_products([product.pk for product in products])
+    
+    @path('<slug:slug>/')
+    def product_detail(self, request, slug):
+        """A single product, rendered once and served from the cache"""
+        from .surrogate import add_surrogate_keys, object_keys  # imports this module
+        
+        product_id = product_slugs.get(slug)
+        if product_id is None:
+            raise Http404("No such product")
+        
+        preview = getattr(request, 'is_preview', False)
+        key = self.product_cache_key(self.pk, product_id)
+        cached = None if preview else cache.get(key)
+        # A slug this process still maps to a renamed product mustn't
+        # serve the page cached under its new slug
+        if cached and cached[0] == slug:
+            _, content, surrogate_keys = cached
+        else:
+            product = (
+                Product.objects.filter(pk=product_id, slug=slug, is_active=True)
+                .select_related('brand__partner', 'category')
+                .first()
+            )
+            if product is None:
+                product_slugs.discard(slug)
+                raise Http404("No such product")
+            # Just the page context, none of the listing's queries
+            context = super().get_context(request)
+            context.update({
+                'product': product,
+                'related_products': product.related_products(self.related_products_count),
+                'products_url': self.get_url(request),
+                'product_url': f"{self.get_full_url(request)}{product.slug}/",
+            })
+            response = TemplateResponse(request, 'business/product_detail.html', context)
+            content = response.render().content
+            if settings.HTML_MINIFY:
+                # Cached minified, so CompressionMiddleware needn't redo it
+                content = minify_html(content.decode()).encode()
+            surrogate_keys = object_keys(product) | object_keys(product.brand)
+            for related in context['related_products']:
+                surrogate_keys |= object_keys(related)
+            if not preview:
+                cache.set(key, (slug, content, surrogate_keys), self.product_cache_seconds)
+        add_surrogate_keys(request, surrogate_keys)
+        response = HttpResponse(content)
+        response.minified = settings.HTML_MINIFY
+        response.page_type = 'product_detail'
+        return response
 
 
 class ContactPage(SEOMixin, Page):
@@ -0,0 +1,177 @@
+"""
+Related-product recommendations computed offline from catalogue features.
+
+Every active product becomes a feature vector made of one-hot blocks for
+its category, brand, partner and specification keys plus TF-IDF weights of
+the words in its name and description. Each block is L2-normalised and
+weighted, so the cosine similarity of two products is a weighted mix of
+"same category", "same brand", ... and "similar wording". Feature matrices are
+sparse (CSR): a product only stores the handful of columns it has, so they
+grow with the catalogue rather than with catalogue x vocabulary.
+Neighbours are found with matrix products over row chunks, which keeps
+memory bounded by ``chunk_size`` x number of products rather than the full
+square matrix.
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from .models import Product, RelatedProduct
+from .versions import bump_content_version
+
+
+# How much each feature block counts towards similarity
+FEATURE_WEIGHTS = {
+    'category': 1.0,
+    'brand': 0.8,
+    'partner': 0.4,
+    'specifications': 0.5,
+    'text': 1.0,
+}
+
+# Words shorter than this, or in fewer products than MIN_DOCUMENT_FREQUENCY,
+# don't make it into the vocabulary
+MIN_WORD_LENGTH = 3
+MIN_DOCUMENT_FREQUENCY = 2
+MAX_VOCABULARY = 2048
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def words(text):
+    return [word for word in WORD_RE.findall(text.lower()) if len(word) >= MIN_WORD_LENGTH]
+
+
+def sparse_rows(entries, row_count, column_count):
+    """CSR matrix from ``(row, column, value)`` entries"""
+    rows, columns, values = zip(*entries) if entries else ((), (), ())
+    return sparse.csr_matrix(
+        (np.array(values, dtype=np.float32), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))),
+        shape=(row_count, column_count),
+    )
+
+
+def one_hot(values):
+    """Rows of a one-hot matrix for ``values``, one column per distinct value"""
+    columns = {value: i for i, value in enumerate(sorted({v for v in values if v is not None}))}
+    entries = [(row, columns[value], 1) for row, value in enumerate(values) if value is not None]
+    return sparse_rows(entries, len(values), len(columns))
+
+
+def multi_hot(value_sets):
+    columns = {value: i for i, value in enumerate(sorted(set().union(*value_sets)))}
+    entries = [(row, columns[value], 1) for row, values in enumerate(value_sets) for value in values]
+    return sparse_rows(entries, len(value_sets), len(columns))
+
+
+def tf_idf(documents):
+    """TF-IDF matrix over the most widespread words of ``documents``"""
+    counts = [Counter(words(document)) for document in documents]
+    document_frequency = Counter()
+    for document in counts:
+        document_frequency.update(document.keys())
+    vocabulary = [
+        word for word, df in document_frequency.most_common(MAX_VOCABULARY)
+        if df >= MIN_DOCUMENT_FREQUENCY and df < len(documents)
+    ]
+    columns = {word: i for i, word in enumerate(vocabulary)}
+    idf = {
+        word: math.log((1 + len(documents)) / (1 + document_frequency[word])) + 1 for word in vocabulary
+    }
+    entries = [
+        (row, columns[word], (1 + math.log(n)) * idf[word])
+        for row, document in enumerate(counts)
+        for word, n in document.items() if word in columns
+    ]
+    return sparse_rows(entries, len(documents), len(columns))
+
+
+def normalise(matrix, weight=1.0):
+    """``matrix`` with its rows scaled to length ``weight``"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()) / weight
+    scale = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(scale.astype(np.float32)) @ matrix
+
+
+def feature_matrix(rows):
+    """Weighted, row-normalised sparse feature matrix for ``rows`` from product_rows()"""
+    blocks = {
+        'category': one_hot([row['category_id'] for row in rows]),
+        'brand': one_hot([row['brand_id'] for row in rows]),
+        'partner': one_hot([row['brand__partner_id'] for row in rows]),
+        'specifications': multi_hot([set(row['specifications'] or {}) for row in rows]),
+        'text': tf_idf([f"{row['name']} {row['description']}" for row in rows]),
+    }
+    return normalise(sparse.hstack(
+        [normalise(block, FEATURE_WEIGHTS[name]) for name, block in blocks.items()], format='csr',
+    ))
+
+
+def product_rows():
+    return list(
+        Product.objects.filter(is_active=True).order_by('pk').values(
+            'pk', 'name', 'description', 'category_id', 'brand_id', 'brand__partner_id', 'specifications',
+        )
+    )
+
+
+def nearest_neighbours(features, top_k, chunk_size=256):
+    """
+    Yield ``(row, neighbour_rows, scores)`` for every row of ``features``.
+
+    Neighbours are sorted by cosine similarity, best first; a row is never
+    its own neighbour and rows with nothing in common are left out.
+    """
+    count = 0 if features is None else features.shape[0]
+    top_k = min(top_k, count - 1)
+    if top_k <= 0:
+        return
+    transposed = features.T.tocsr()
+    for start in range(0, count, chunk_size):
+        # Negated, so the best matches sort first
+        distance = -(features[start:start + chunk_size] @ transposed).toarray()
+        rows = np.arange(len(distance))
+        distance[rows, rows + start] = np.inf
+        candidates = np.argpartition(distance, top_k - 1, axis=1)[:, :top_k]
+        scores = -np.take_along_axis(distance, candidates, axis=1)
+        order = np.argsort(-scores, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        for row in rows:
+            keep = scores[row] > 0
+            yield start + row, candidates[row][keep], scores[row][keep]
+
+
+def build_recommendations(top_k=8, chunk_size=256):
+    """
+    Recompute the related products of every active product.
+
+    Replaces the whole RelatedProduct table in one transaction and returns
+    the number of products that got recommendations. Cached product pages,
+    which list related products, are invalidated once it commits.
+    """
+    rows = product_rows()
+    ids = [row['pk'] for row in rows]
+    features = feature_matrix(rows) if rows else None
+    del rows
+
+    with_recommendations = 0
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        batch = []
+        for row, neighbours, scores in nearest_neighbours(features, top_k, chunk_size):
+            with_recommendations += len(neighbours) > 0
+            batch.extend(
+                RelatedProduct(product_id=ids[row], related_id=ids[neighbour], rank=rank, score=float(score))
+                for rank, (neighbour, score) in enumerate(zip(neighbours, scores), start=1)
+            )
+            if len(batch) >= 1000:
+                RelatedProduct.objects.bulk_create(batch)
+                batch = []
+        RelatedProduct.objects.bulk_create(batch)
+        bump_content_version('related')
+    return with_recommendations
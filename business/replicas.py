@@ -0,0 +1,292 @@
+"""
+Read replicas for public traffic.
+
+Databases whose ``TEST['MIRROR']`` is ``default`` are replicas of it
+(settings.py adds one per URL in ``REPLICA_DATABASE_URLS``).
+ReplicaMiddleware picks a replica for each GET or HEAD outside the admin,
+and ReplicaRouter sends that request's reads to it. Everything else,
+including every write, goes to the primary.
+
+A replica is only used while it is less than ``REPLICA_MAX_LAG`` seconds
+behind the primary. Each worker measures the lag at most every
+``REPLICA_LAG_CHECK_SECONDS``, and treats a replica it can't reach as too
+far behind. Writes to model tables, spotted as INSERT, UPDATE and DELETE
+statements on the primary (``db_for_write`` is also asked about reads such
+as the lookup in ``get_or_create``), keep reads on the primary for
+``REPLICA_STICKY_SECONDS``. The database cache's table isn't a model's, so
+caching a page or a search result doesn't count as a write:
+
+- For the rest of the request that wrote.
+- For the client that wrote, through a cookie, so an editor sees their
+  own changes on the site straight after saving them. A response setting
+  it is never publicly cacheable.
+- For everyone, through a fence in the default cache, so pages and
+  fragments cached after a publish aren't rebuilt from rows a replica
+  hasn't replayed yet. With a cache shared between workers this covers
+  every worker; with the per-process default it covers the one that
+  wrote.
+"""
+import functools
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.utils.cache import patch_cache_control
+
+from .metrics import register
+from .middleware import FastPathMiddleware
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds since the last transaction replayed, or 0 when the replica has
+# replayed everything it received
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# Apps always read from the primary: a visitor who has just logged in must
+# find their session and user, and the database cache (content versions)
+# must not lag behind a bump
+PRIMARY_APPS = {'sessions', 'auth', 'django_cache'}
+
+FENCE_KEY = 'replicas:primary_until'
+
+# The table an INSERT, UPDATE or DELETE writes to
+WRITE_RE = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+["`]?([^\s"`(]+)', re.IGNORECASE)
+
+
+@functools.cache
+def replica_aliases():
+    return [
+        alias for alias, database in settings.DATABASES.items()
+        if database.get('TEST', {}).get('MIRROR') == DEFAULT_DB_ALIAS
+    ]
+
+
+def measure_lag(alias):
+    """Replication lag of ``alias`` in seconds, or None if it can't be reached"""
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0])
+        # Other backends can't report lag; a reachable replica counts as current
+        connection.ensure_connection()
+        return 0.0
+    except DatabaseError as e:
+        logger.warning("Replica %s is unavailable: %s", alias, e)
+        return None
+
+
+class ReplicaMonitor:
+    """Replication lag of each replica, measured at most every ``check_seconds``"""
+
+    def __init__(self):
+        self.checked = {}
+        # Requests whose reads went to each database
+        self.routed = {}
+
+    @property
+    def check_seconds(self):
+        return getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 5)
+
+    def needs_check(self):
+        now = time.monotonic()
+        return any(
+            now - self.checked.get(alias, (float('-inf'), None))[0] > self.check_seconds
+            for alias in replica_aliases()
+        )
+
+    def lag(self, alias):
+        checked_at, lag = self.checked.get(alias, (float('-inf'), None))
+        if time.monotonic() - checked_at > self.check_seconds:
+            lag = measure_lag(alias)
+            self.checked[alias] = (time.monotonic(), lag)
+        return lag
+
+    def choose(self):
+        """A replica close enough to the primary, or None"""
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 5)
+        current = [alias for alias in replica_aliases() if (lag := self.lag(alias)) is not None and lag <= max_lag]
+        return random.choice(current) if current else None
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'requests': dict(self.routed),
+            'lag': {
+                alias: {'seconds': lag, 'checked_seconds_ago': round(now - checked_at, 1)}
+                for alias, (checked_at, lag) in self.checked.items()
+            },
+        }
+
+
+monitor = ReplicaMonitor()
+
+
+# Writes
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+fenced_until = 0
+
+
+def set_fence():
+    global fenced_until
+    until = time.time() + sticky_seconds()
+    # A transaction can commit many writes; one fence covers them
+    if until - fenced_until < 1:
+        return
+    fenced_until = until
+    cache.set(FENCE_KEY, until, sticky_seconds())
+
+
+def primary_required():
+    return cache.get(FENCE_KEY, 0) > time.time()
+
+
+@functools.cache
+def model_tables():
+    return {model._meta.db_table for model in apps.get_models(include_auto_created=True)}
+
+
+def is_model_write(sql):
+    match = WRITE_RE.match(sql)
+    return match is not None and match[1] in model_tables()
+
+
+def record_writes(execute, sql, params, many, context):
+    """Execute wrapper marking the current request as written to and fencing the replicas"""
+    if is_model_write(sql):
+        state = routing.get()
+        if state is not None:
+            state.written = True
+        transaction.on_commit(set_fence, using=context['connection'].alias)
+    return execute(sql, params, many, context)
+
+
+def watch_writes(sender, connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS and replica_aliases() and record_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_writes)
+
+
+connection_created.connect(watch_writes, dispatch_uid='replicas_watch_writes')
+
+
+# Routing
+
+class RequestRouting:
+    """Where the reads of one request go"""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.written = False
+
+
+routing = ContextVar('replica_routing', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or state.replica is None or state.written or model._meta.app_label in PRIMARY_APPS:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Route the reads of public GET and HEAD requests to a replica"""
+
+    sync_capable = True
+    async_capable = True
+
+    cookie_name = 'use_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.route(request)
+        token = routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        return self.process_response(request, response, state)
+
+    async def __acall__(self, request):
+        # Only measuring lag touches the database
+        if self.is_replica_read(request) and monitor.needs_check():
+            state = await sync_to_async(self.route, thread_sensitive=True)(request)
+        else:
+            state = self.route(request)
+        token = routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing.reset(token)
+        return self.process_response(request, response, state)
+
+    def is_replica_read(self, request):
+        return (
+            bool(replica_aliases())
+            and request.method in ('GET', 'HEAD')
+            and not request.path_info.startswith(FastPathMiddleware.excluded_prefixes)
+            and self.cookie_name not in request.COOKIES
+        )
+
+    def route(self, request):
+        replica = None
+        if self.is_replica_read(request) and not primary_required():
+            replica = monitor.choose()
+        alias = replica or DEFAULT_DB_ALIAS
+        monitor.routed[alias] = monitor.routed.get(alias, 0) + 1
+        return RequestRouting(replica)
+
+    def process_response(self, request, response, state):
+        if state.written:
+            # Caches shared between visitors must not hand the cookie on
+            patch_cache_control(response, private=True)
+            response.set_cookie(
+                self.cookie_name, '1', max_age=sticky_seconds(), httponly=True, samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
+
+
+register('replicas', monitor.stats)
@@ -0,0 +1,113 @@
+"""
+Cached route resolution for Wagtail front-end pages.
+
+Wagtail finds the Site for every request with a query, then walks the page
+tree from the site root with a query per path segment. The site has a
+small, fixed set of pages, so the mapping from (hostname, path) to page id
+and content type is kept in memory instead, and a request only fetches
+the page it ends up serving. The table is dropped whenever pages are
+published, unpublished, moved, renamed or deleted and when sites change;
+anything it can't answer goes through Wagtail's normal routing.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404
+from django.http.request import split_domain_port
+from wagtail import views as wagtail_views
+from wagtail.models import Page, Site
+
+
+class PageRoutes:
+    """In-process table of live page routes, per site"""
+
+    def __init__(self):
+        self.table = None
+
+    def clear(self, **kwargs):
+        self.table = None
+
+    def load(self):
+        sites = list(Site.objects.select_related('root_page'))
+        pages = list(Page.objects.live().values_list('url_path', 'pk', 'content_type_id'))
+        routes = {}
+        for site in sites:
+            root_path = site.root_page.url_path
+            routes[site.pk] = {
+                tuple(component for component in url_path[len(root_path):].split('/') if component): (pk, content_type_id)
+                for url_path, pk, content_type_id in pages
+                if url_path.startswith(root_path)
+            }
+        return {'sites': sites, 'hosts': {}, 'routes': routes}
+
+    def find_site(self, table, hostname, port):
+        """Pick a site the way wagtail.models.sites.get_site_for_hostname does"""
+        key = (hostname, port)
+        if key not in table['hosts']:
+            sites = table['sites']
+            exact = [site for site in sites if site.hostname == hostname and site.port == port]
+            default_for_host = [site for site in sites if site.hostname == hostname and site.is_default_site]
+            by_host = [site for site in sites if site.hostname == hostname]
+            default = [site for site in sites if site.is_default_site]
+            if exact:
+                site = exact[0]
+            elif default_for_host:
+                site = default_for_host[0]
+            elif len(by_host) == 1:
+                site = by_host[0]
+            elif default:
+                site = default[0]
+            else:
+                site = None
+            table['hosts'][key] = site
+        return table['hosts'][key]
+
+    def route(self, request, path):
+        """
+        Resolve ``path`` to Wagtail's ``(page, args, kwargs)`` route result.
+
+        Returns None when the table can't answer, leaving the request to
+        Wagtail's own routing. Raises Http404 for routes the page rejects.
+        """
+        table = self.table
+        if table is None:
+            table = self.table = self.load()
+
+        site = self.find_site(table, split_domain_port(request._get_raw_host())[0], request.get_port())
+        if site is None:
+            return None
+        routes = table['routes'][site.pk]
+
+        # The deepest known page on the path; routable pages take the rest
+        components = tuple(component for component in path.split('/') if component)
+        for depth in range(len(components), -1, -1):
+            if components[:depth] in routes:
+                page_id, content_type_id = routes[components[:depth]]
+                break
+        else:
+            return None
+
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        page = model._default_manager.filter(pk=page_id).first()
+        expected_path = site.root_page.url_path + ''.join(f'{component}/' for component in components[:depth])
+        if page is None or not page.live or page.url_path != expected_path:
+            # Changed in another process since the table was built
+            self.clear()
+            return None
+
+        request._wagtail_site = site
+        return page.route(request, list(components[depth:]))
+
+
+page_routes = PageRoutes()
+
+
+def serve(request, path):
+    """wagtail.views.serve, with the page route looked up in ``page_routes``"""
+    if not hasattr(request, '_wagtail_route_for_request'):
+        try:
+            route = page_routes.route(request, path)
+        except Http404:
+            request._wagtail_route_for_request = None
+        else:
+            if route is not None:
+                request._wagtail_route_for_request = route
+    return wagtail_views.serve(request, path)
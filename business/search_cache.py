@@ -0,0 +1,145 @@
+"""
+Cache of product search results.
+
+Popular searches repeat with identical results, so ``product_search``
+keeps its encoded responses in two tiers: an LRU in each worker process
+holding up to ``SEARCH_CACHE_SIZE`` results, and the Django cache named by
+``SEARCH_CACHE_ALIAS``, which workers share when it is a shared backend.
+Both keep a result for ``SEARCH_CACHE_SECONDS``.
+
+Keys are built from the normalised search (query text with case and
+spacing folded, category, brand and specification filters) and the
+"product" content version (business.versions), which every product,
+brand and category change bumps. A change therefore makes every cached
+result unreachable at once, and old entries age out of both tiers.
+
+So that a local hit costs no round trip to the shared cache, each process
+reads the version at most every ``SEARCH_CACHE_VERSION_SECONDS``. A bump
+made in the process is seen straight away; other processes see it within
+that interval.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import register
+from .versions import aget_content_version, content_version_bumped
+
+
+def normalize_query(value):
+    """Search text with surrounding and repeated whitespace removed"""
+    return ' '.join(value.split())
+
+
+class LRUCache:
+    """Thread-safe in-process LRU whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SearchCache:
+    """Encoded search results in the process LRU, backed by a shared cache"""
+
+    def __init__(self):
+        self.local = LRUCache(
+            getattr(settings, 'SEARCH_CACHE_SIZE', 512), getattr(settings, 'SEARCH_CACHE_SECONDS', 60),
+        )
+        self.counts = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+        self.forget_version()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'SEARCH_CACHE_ALIAS', 'default')]
+
+    async def version(self):
+        """The catalogue's content version, read at most every SEARCH_CACHE_VERSION_SECONDS"""
+        read_at, version = self.read_version
+        if time.monotonic() - read_at > getattr(settings, 'SEARCH_CACHE_VERSION_SECONDS', 2):
+            version = await aget_content_version('product')
+            self.read_version = (time.monotonic(), version)
+        return version
+
+    def forget_version(self):
+        self.read_version = (float('-inf'), None)
+
+    async def key(self, query, category, brand, specifications):
+        """Cache key of a normalised search under the current catalogue version"""
+        version = await self.version()
+        search = '\x1f'.join([
+            query.casefold(), category.casefold(), brand.casefold(),
+            *(f'{key}={value}' for key, value in sorted(specifications.items())),
+        ])
+        return f"search:{version}:{hashlib.md5(search.encode()).hexdigest()}"
+
+    async def aget(self, key):
+        content = self.local.get(key)
+        if content is not None:
+            self.counts['local_hits'] += 1
+            return content
+        content = await self.shared.aget(key)
+        if content is not None:
+            self.counts['shared_hits'] += 1
+            self.local.set(key, content)
+            return content
+        self.counts['misses'] += 1
+        return None
+
+    async def aset(self, key, content):
+        self.local.set(key, content)
+        await self.shared.aset(key, content, self.local.ttl)
+
+    def stats(self):
+        lookups = sum(self.counts.values())
+        hits = self.counts['local_hits'] + self.counts['shared_hits']
+        return {
+            **self.counts,
+            'hit_ratio': round(hits / lookups, 3) if lookups else None,
+            'local_entries': len(self.local),
+        }
+
+
+search_cache = SearchCache()
+
+register('search_cache', search_cache.stats)
+
+
+def forget_product_version(sender, scopes, **kwargs):
+    if 'product' in scopes:
+        search_cache.forget_version()
+
+
+content_version_bumped.connect(forget_product_version, dispatch_uid='search_cache_product_version')
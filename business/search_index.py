@@ -0,0 +1,158 @@
+"""
+Batched, coalesced search index updates.
+
+Wagtail's post_save handler enqueues one indexing task per save, which
+extracts the object's search content (HomePage renders its whole
+``content_sections`` StreamField) and writes it to the index, and its
+post_delete handler updates the index in the deleting request. When tasks
+run in the background (business.tasks.runs_in_background), saves and
+deletes here only queue the object in SearchIndexUpdate, one row per
+object however often it changes, and the update_search_index task indexes
+the queue in batches of ``SEARCH_INDEX_BATCH_SIZE`` per model. Objects that
+no longer exist are removed from the index.
+
+The task runs on the ``TASKS`` backend once the saving transaction
+commits; with the DatabaseBackend ``db_worker`` runs it
+``SEARCH_INDEX_DELAY`` seconds later, so edits made in the meantime join
+the same batch. With the default ImmediateBackend the task would run in
+the saving request anyway, so Wagtail's own signal handlers are left to
+index single saves (business/signals.py). Bulk writes, which send no
+signals, queue their objects with queue_index_update() with any backend.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django_tasks import task
+from wagtail.search import index
+from wagtail.search.backends import get_search_backends_with_name
+
+from .metrics import register
+from .models import SearchIndexUpdate
+
+
+logger = logging.getLogger(__name__)
+
+# Set while an update_search_index task is waiting to run
+SCHEDULED_KEY = 'search_index:scheduled'
+
+# Totals of this process, for the metrics report
+stats = {'runs': 0, 'indexed': 0, 'removed': 0}
+
+
+def indexed_model(model):
+    """The model ``model`` is indexed as, or None if it isn't auto-updated"""
+    if not issubclass(model, index.Indexed) or not getattr(model, 'search_auto_update', True):
+        return None
+    return model
+
+
+def queue_index_update(model, object_ids):
+    """Queue objects of ``model`` to be reindexed, or removed if they are gone"""
+    if not object_ids or indexed_model(model) is None:
+        return
+    content_type = ContentType.objects.get_for_model(model)
+    now = timezone.now()
+    SearchIndexUpdate.objects.bulk_create(
+        [
+            SearchIndexUpdate(content_type=content_type, object_id=str(object_id), queued_at=now)
+            for object_id in sorted({str(object_id) for object_id in object_ids})
+        ],
+        update_conflicts=True, unique_fields=['content_type', 'object_id'], update_fields=['queued_at'],
+    )
+    # One run after the transaction however many objects it queues
+    pending = transaction.get_connection().run_on_commit
+    if not any(function is schedule_index_update for _, function, _ in pending):
+        transaction.on_commit(schedule_index_update)
+
+
+def queue_instance(sender, instance, raw=False, **kwargs):
+    """post_save and post_delete receiver"""
+    if raw:
+        return
+    # Pages are indexed as their specific type, even when saved through Page
+    model = getattr(instance, 'specific_class', None) or type(instance)
+    queue_index_update(model, [instance.pk])
+
+
+def schedule_index_update():
+    """Enqueue update_search_index unless a run is already waiting"""
+    delay = getattr(settings, 'SEARCH_INDEX_DELAY', 5)
+    # Expires on its own if a worker dies holding it
+    if not cache.add(SCHEDULED_KEY, True, delay + 60):
+        return
+    update = update_search_index
+    if delay and update.get_backend().supports_defer:
+        update = update.using(run_after=timezone.now() + timedelta(seconds=delay))
+    update.enqueue()
+
+
+@task()
+def update_search_index():
+    """Index the queued objects"""
+    # Objects queued from now on need another run
+    cache.delete(SCHEDULED_KEY)
+    return apply_queued_updates()
+
+
+def apply_queued_updates(batch_size=None):
+    """
+    Index the objects queued so far, in batches per model.
+
+    Returns the number of objects indexed and removed. An object queued
+    again while this runs keeps its row, as the version indexed may
+    predate the change.
+    """
+    batch_size = batch_size or getattr(settings, 'SEARCH_INDEX_BATCH_SIZE', 500)
+    started = timezone.now()
+    queued = SearchIndexUpdate.objects.filter(queued_at__lte=started)
+    totals = {'indexed': 0, 'removed': 0}
+    for content_type_id in queued.values_list('content_type_id', flat=True).distinct().order_by():
+        updates = queued.filter(content_type_id=content_type_id).order_by('pk')
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        last = 0
+        while batch := list(updates.filter(pk__gt=last).values_list('pk', 'object_id')[:batch_size]):
+            last = batch[-1][0]
+            if model is not None and indexed_model(model) is not None:
+                result = index_batch(model, [object_id for _, object_id in batch])
+                if result is None:
+                    # Left queued for the next run
+                    continue
+                totals['indexed'] += result[0]
+                totals['removed'] += result[1]
+            queued.filter(pk__in=[pk for pk, _ in batch]).delete()
+    stats['runs'] += 1
+    stats['indexed'] += totals['indexed']
+    stats['removed'] += totals['removed']
+    return totals
+
+
+def index_batch(model, object_ids):
+    """Index one batch of objects; None if a search backend failed"""
+    objects = list(model.get_indexed_objects().filter(pk__in=object_ids))
+    found = {str(obj.pk) for obj in objects}
+    missing = [object_id for object_id in object_ids if object_id not in found]
+    for name, backend in get_search_backends_with_name(with_auto_update=True):
+        try:
+            if objects:
+                backend.add_bulk(model, objects)
+            for object_id in missing:
+                backend.delete(model(pk=object_id))
+        except Exception:
+            logger.exception(
+                "Couldn't update %d %s objects in the '%s' search backend",
+                len(object_ids), model._meta.label, name,
+            )
+            return None
+    return len(objects), len(missing)
+
+
+def queue_stats():
+    return {**stats, 'queued': SearchIndexUpdate.objects.count()}
+
+
+register('search_index', queue_stats)
@@ -0,0 +1,240 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from wagtail.models import Page, Site
+from wagtail.search import signal_handlers as search_signal_handlers
+from wagtail.search.index import get_indexed_models
+
+from seo.models import GlobalSEOSettings
+from wagtail.signals import page_published, page_slug_changed, page_unpublished, post_page_move
+
+from .catalogue import adjust_product_counts, adjust_spec_values
+from .models import Brand, CatalogueChange, Partner, Product, ProductCategory, ProductsPage, product_slugs
+from .routing import page_routes
+from .search_index import queue_instance
+from .surrogate import SURROGATE_KEY_PREFIXES, purge_surrogate_keys
+from .tasks import runs_in_background, warm_published_page
+from .versions import bump_content_version
+
+
+# Models whose changes are published through the partner change feed
+CHANGE_FEED_MODELS = [Product, Brand, Partner, ProductCategory]
+
+
+def record_save(sender, instance, created, raw=False, **kwargs):
+    # Fixtures loaded with loaddata are not catalogue edits
+    if raw:
+        return
+    action = CatalogueChange.INSERT if created else CatalogueChange.UPDATE
+    CatalogueChange.record(sender, [instance.pk], action)
+
+
+def record_delete(sender, instance, **kwargs):
+    CatalogueChange.record(sender, [instance.pk], CatalogueChange.DELETE)
+
+
+for model in CHANGE_FEED_MODELS:
+    post_save.connect(record_save, sender=model, dispatch_uid=f'change_feed_save_{model._meta.model_name}')
+    post_delete.connect(record_delete, sender=model, dispatch_uid=f'change_feed_delete_{model._meta.model_name}')
+
+
+# Active product counts on categories, brands and partners, and the
+# specification value catalogue. The stored row is read before each save so
+# the counts move with category, brand, specification and is_active changes;
+# reconcile_product_counts() and rebuild_spec_values() repair any drift.
+
+def remember_product_counted(sender, instance, raw=False, **kwargs):
+    instance._counted_before = instance._specs_before = None
+    if not raw and not instance._state.adding:
+        row = Product.objects.filter(
+            pk=instance.pk, is_active=True
+        ).values_list('category_id', 'brand_id', 'specifications').first()
+        if row:
+            instance._counted_before, instance._specs_before = row[:2], row[2]
+
+
+def update_counts_on_product_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_counted_before', None)
+    after = (instance.category_id, instance.brand_id) if instance.is_active else None
+    with transaction.atomic():
+        if before != after:
+            if before:
+                adjust_product_counts(*before, -1)
+            if after:
+                adjust_product_counts(*after, 1)
+        adjust_spec_values(
+            getattr(instance, '_specs_before', None),
+            instance.specifications if instance.is_active else None,
+        )
+
+
+def update_counts_on_product_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        adjust_product_counts(instance.category_id, instance.brand_id, -1)
+        adjust_spec_values(instance.specifications, None)
+
+
+def remember_brand_partner(sender, instance, raw=False, **kwargs):
+    instance._partner_before = None
+    if not raw and not instance._state.adding:
+        instance._partner_before = Brand.objects.filter(
+            pk=instance.pk
+        ).values_list('partner_id', 'active_product_count').first()
+
+
+def move_counts_on_brand_save(sender, instance, raw=False, **kwargs):
+    """Carry a brand's active products over when it changes partner"""
+    before = getattr(instance, '_partner_before', None)
+    if raw or not before or before[0] == instance.partner_id or not before[1]:
+        return
+    partner_id, count = before
+    with transaction.atomic():
+        Partner.objects.filter(pk=partner_id).update(active_product_count=F('active_product_count') - count)
+        Partner.objects.filter(pk=instance.partner_id).update(active_product_count=F('active_product_count') + count)
+
+
+pre_save.connect(remember_product_counted, sender=Product, dispatch_uid='product_counts_pre_save')
+post_save.connect(update_counts_on_product_save, sender=Product, dispatch_uid='product_counts_save')
+post_delete.connect(update_counts_on_product_delete, sender=Product, dispatch_uid='product_counts_delete')
+pre_save.connect(remember_brand_partner, sender=Brand, dispatch_uid='brand_partner_pre_save')
+post_save.connect(move_counts_on_brand_save, sender=Brand, dispatch_uid='brand_partner_save')
+
+
+# Product detail pages: the slug index and cached renders follow product,
+# brand and category edits
+
+def refresh_product_page_on_save(sender, instance, **kwargs):
+    product_slugs.update(instance)
+    ProductsPage.invalidate_products([instance.pk])
+
+
+def refresh_product_page_on_delete(sender, instance, **kwargs):
+    # Before the delete cascades to the recommendations that show it
+    product_slugs.update(instance, deleted=True)
+    ProductsPage.invalidate_products([instance.pk])
+
+
+def refresh_product_pages_of(sender, instance, **kwargs):
+    """Brand and category names are part of every product page that shows them"""
+    lookup = 'brand' if sender is Brand else 'category'
+    product_ids = list(Product.objects.filter(**{lookup: instance.pk}).values_list('pk', flat=True))
+    if product_ids:
+        ProductsPage.invalidate_products(product_ids)
+
+
+post_save.connect(refresh_product_page_on_save, sender=Product, dispatch_uid='product_page_save')
+pre_delete.connect(refresh_product_page_on_delete, sender=Product, dispatch_uid='product_page_delete')
+post_save.connect(refresh_product_pages_of, sender=Brand, dispatch_uid='brand_product_pages_save')
+post_save.connect(refresh_product_pages_of, sender=ProductCategory, dispatch_uid='category_product_pages_save')
+
+
+# Cached page routes (business.routing) follow the page tree and sites
+
+for name, signal in [
+    ('published', page_published),
+    ('unpublished', page_unpublished),
+    ('slug_changed', page_slug_changed),
+    ('moved', post_page_move),
+]:
+    signal.connect(page_routes.clear, dispatch_uid=f'page_routes_{name}')
+post_delete.connect(page_routes.clear, sender=Page, dispatch_uid='page_routes_page_delete')
+post_save.connect(page_routes.clear, sender=Site, dispatch_uid='page_routes_site_save')
+post_delete.connect(page_routes.clear, sender=Site, dispatch_uid='page_routes_site_delete')
+
+
+# Shared cache purges by surrogate key (business.surrogate)
+
+def purge_object(sender, instance, **kwargs):
+    # Listings served from cached fragments are only tagged with list keys
+    prefix = SURROGATE_KEY_PREFIXES[sender]
+    purge_surrogate_keys([f"{prefix}-{instance.pk}", f"{prefix}-list"])
+
+
+def purge_page(sender, instance, **kwargs):
+    purge_surrogate_keys([f"page-{instance.pk}"])
+
+
+def purge_all_pages(sender, **kwargs):
+    purge_surrogate_keys(["pages"])
+
+
+for model in SURROGATE_KEY_PREFIXES:
+    post_save.connect(purge_object, sender=model, dispatch_uid=f'surrogate_save_{model._meta.model_name}')
+    post_delete.connect(purge_object, sender=model, dispatch_uid=f'surrogate_delete_{model._meta.model_name}')
+for name, signal in [
+    ('published', page_published),
+    ('unpublished', page_unpublished),
+    ('moved', post_page_move),
+]:
+    signal.connect(purge_page, dispatch_uid=f'surrogate_page_{name}')
+post_delete.connect(purge_page, sender=Page, dispatch_uid='surrogate_page_delete')
+post_save.connect(purge_all_pages, sender=GlobalSEOSettings, dispatch_uid='surrogate_seo_settings')
+
+
+# Content versions behind cached template fragments (business.versions)
+
+CONTENT_VERSION_SCOPES = {
+    Partner: 'partner',
+    # Product cards show the brand and category names
+    Product: 'product',
+    Brand: 'product',
+    ProductCategory: 'product',
+    GlobalSEOSettings: 'settings',
+}
+
+
+def bump_version_on_change(sender, **kwargs):
+    bump_content_version(CONTENT_VERSION_SCOPES[sender])
+
+
+for model in CONTENT_VERSION_SCOPES:
+    post_save.connect(bump_version_on_change, sender=model, dispatch_uid=f'content_version_save_{model._meta.model_name}')
+    post_delete.connect(bump_version_on_change, sender=model, dispatch_uid=f'content_version_delete_{model._meta.model_name}')
+
+
+def bump_pages_version(sender, **kwargs):
+    # The header's menu links to the site's pages
+    bump_content_version('pages')
+
+
+for name, signal in [
+    ('published', page_published),
+    ('unpublished', page_unpublished),
+    ('moved', post_page_move),
+]:
+    signal.connect(bump_pages_version, dispatch_uid=f'content_version_pages_{name}')
+post_delete.connect(bump_pages_version, sender=Page, dispatch_uid='content_version_pages_delete')
+
+
+# With a background task backend, search index updates are queued and
+# applied in batches (business.search_index) instead of in the saving
+# request. When tasks run immediately the queue would only add a write to
+# that request, so Wagtail's own handlers stay
+
+if runs_in_background():
+    for model in get_indexed_models():
+        post_save.disconnect(search_signal_handlers.post_save_signal_handler, sender=model)
+        post_delete.disconnect(search_signal_handlers.post_delete_signal_handler, sender=model)
+        post_save.connect(queue_instance, sender=model, dispatch_uid=f'search_index_save_{model._meta.label_lower}')
+        post_delete.connect(
+            queue_instance, sender=model, dispatch_uid=f'search_index_delete_{model._meta.label_lower}',
+        )
+
+
+# Published pages are rendered again straight away (business.warmup), so
+# the first visitor doesn't wait for renditions and cached fragments
+
+def warm_on_publish(sender, instance, **kwargs):
+    enabled = getattr(settings, 'WARM_ON_PUBLISH', None)
+    if enabled is None:
+        enabled = runs_in_background()
+    if enabled:
+        transaction.on_commit(partial(warm_published_page.enqueue, instance.pk))
+
+
+page_published.connect(warm_on_publish, dispatch_uid='warm_on_publish')
@@ -0,0 +1,284 @@
+"""
+Smaller static files.
+
+StaticFilesStorage extends WhiteNoise's compressed manifest storage. During
+collectstatic it optimises the project's own images losslessly before they
+are hashed, writes AVIF and WebP variants of raster images next to them
+(``Rani.png.avif``), and adds zstd files beside WhiteNoise's gzip and
+Brotli ones when ``zstandard`` is installed. WhiteNoiseMiddleware also
+serves the zstd files, and ``{% static_picture %}`` offers the image
+variants to browsers that support them. Hashed names are served with a
+far-future immutable Cache-Control by WhiteNoise, and under ASGI the
+middleware runs without being adapted to a thread.
+"""
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.headers import Headers
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.staticfiles.utils import matches_patterns
+from django.core.files.base import ContentFile
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from PIL import Image, UnidentifiedImageError
+from whitenoise import compress, middleware, responders, storage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+OPTIMISED_PATTERNS = ['*.png', '*.jpg', '*.jpeg', '*.svg']
+RASTER_PATTERNS = ['*.png', '*.jpg', '*.jpeg', '*.webp']
+
+# Variants in the order browsers should prefer them, with encoder options
+IMAGE_VARIANTS = {
+    'avif': {'quality': 80},
+    'webp': {'quality': 85},
+}
+
+SVG_JUNK_RE = re.compile(
+    r'<!--.*?-->|<\?xml[^>]*\?>|<!DOCTYPE[^>]*>|<metadata\b.*?</metadata>'
+    r'|<sodipodi:namedview\b.*?(/>|</sodipodi:namedview>)',
+    re.S,
+)
+SVG_EDITOR_ATTRIBUTE_RE = re.compile(r'\s(?:inkscape|sodipodi):[\w-]+="[^"]*"')
+SVG_WHITESPACE_RE = re.compile(r'>\s+<')
+
+
+# Images
+
+def optimise_png(data):
+    image = Image.open(io.BytesIO(data))
+    output = io.BytesIO()
+    options = {'optimize': True}
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    image.save(output, 'PNG', **options)
+    return output.getvalue()
+
+
+def optimise_jpeg(data):
+    """
+    Rebuild the Huffman tables and drop metadata with jpegtran, which
+    doesn't decode the image; without jpegtran JPEGs are left as they are.
+    """
+    jpegtran = shutil.which('jpegtran')
+    if jpegtran is None:
+        return data
+    return subprocess.run(
+        [jpegtran, '-copy', 'none', '-optimize', '-progressive'],
+        input=data, capture_output=True, check=True,
+    ).stdout
+
+
+def optimise_svg(data):
+    text = data.decode('utf-8')
+    text = SVG_JUNK_RE.sub('', text)
+    text = SVG_EDITOR_ATTRIBUTE_RE.sub('', text)
+    return SVG_WHITESPACE_RE.sub('><', text).strip().encode('utf-8')
+
+
+def optimise_image(name, data):
+    """``data`` optimised for the image type of ``name``, if that made it smaller"""
+    extension = os.path.splitext(name)[1].lower()
+    try:
+        if extension == '.svg':
+            optimised = optimise_svg(data)
+        elif extension == '.png':
+            optimised = optimise_png(data)
+        else:
+            optimised = optimise_jpeg(data)
+    except (OSError, UnicodeDecodeError, UnidentifiedImageError, subprocess.CalledProcessError) as e:
+        logger.warning("Couldn't optimise %s: %s", name, e)
+        return data
+    return optimised if len(optimised) < len(data) else data
+
+
+def image_variants(name, data):
+    """AVIF and WebP encodings of the raster image ``data`` that are smaller than it"""
+    variants = {}
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, UnidentifiedImageError) as e:
+        logger.warning("Couldn't convert %s: %s", name, e)
+        return variants
+    for format, options in IMAGE_VARIANTS.items():
+        if name.lower().endswith(f'.{format}'):
+            continue
+        output = io.BytesIO()
+        try:
+            image.save(output, format.upper(), **options)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Couldn't convert %s to %s: %s", name, format, e)
+            continue
+        if output.tell() < len(data):
+            variants[f'{name}.{format}'] = output.getvalue()
+    return variants
+
+
+def render_picture(path, attrs):
+    """
+    An <img> for the static image ``path``, wrapped in a <picture> offering
+    the variants collectstatic made of it.
+    """
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    sources = [
+        (static(f'{path}.{format}'), f'image/{format}')
+        for format in IMAGE_VARIANTS
+        if f'{path}.{format}' in hashed_files
+    ]
+    img = format_html('<img src="{}"{}>', static(path), flatatt(attrs))
+    if not sources:
+        return img
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join('', '<source srcset="{}" type="{}">', sources),
+        img,
+    )
+
+
+# Storage
+
+class Compressor(compress.Compressor):
+    """WhiteNoise's compressor, also writing zstd files when it can"""
+
+    SKIP_COMPRESS_EXTENSIONS = compress.Compressor.SKIP_COMPRESS_EXTENSIONS + ('avif', 'zst')
+
+    def compress(self, path):
+        filenames = super().compress(path)
+        # Nothing was written when compression didn't pay off
+        if zstandard is None or not filenames:
+            return filenames
+        with open(path, 'rb') as f:
+            stat_result = os.fstat(f.fileno())
+            data = f.read()
+        compressed = zstandard.ZstdCompressor(level=19).compress(data)
+        if self.is_compressed_effectively('Zstandard', path, len(data), compressed):
+            filenames.append(self.write_data(path, compressed, '.zst', stat_result))
+        return filenames
+
+
+class StaticFilesStorage(storage.CompressedManifestStaticFilesStorage):
+    """
+    Fingerprinted, compressed static files with optimised images.
+
+    Only files from STATICFILES_DIRS are optimised and converted; app
+    assets such as the admin's ship optimised already.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = self.optimise_images(paths)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def optimise_images(self, paths):
+        """
+        Replace the project's images in ``paths`` with optimised copies in
+        this storage, and add their variants, so both get hashed.
+        """
+        paths = dict(paths)
+        project_dirs = {
+            os.path.abspath(root[1] if isinstance(root, (list, tuple)) else root)
+            for root in settings.STATICFILES_DIRS
+        }
+        images = [
+            (name, source_storage, path)
+            for name, (source_storage, path) in paths.items()
+            if os.path.abspath(source_storage.location) in project_dirs
+            and matches_patterns(name, OPTIMISED_PATTERNS + RASTER_PATTERNS)
+        ]
+
+        def process(image):
+            name, source_storage, path = image
+            with source_storage.open(path) as f:
+                data = f.read()
+            if matches_patterns(name, OPTIMISED_PATTERNS):
+                data = optimise_image(name, data)
+            files = {name: data}
+            if matches_patterns(name, RASTER_PATTERNS):
+                files.update(image_variants(name, data))
+            return files
+
+        with ThreadPoolExecutor() as executor:
+            for files in executor.map(process, images):
+                for name, data in files.items():
+                    if self.exists(name):
+                        self.delete(name)
+                    self._save(name, ContentFile(data))
+                    paths[name] = (self, name)
+        return paths
+
+    def create_compressor(self, **kwargs):
+        return Compressor(**kwargs)
+
+
+# Serving
+
+class WhiteNoiseMiddleware(middleware.WhiteNoiseMiddleware):
+    """WhiteNoise, also serving zstd files to browsers that accept them"""
+
+    ENCODINGS = {'zstd': '.zst', 'br': '.br', 'gzip': '.gz'}
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+    @classmethod
+    def is_compressed_variant(cls, path, stat_cache=None):
+        for suffix in cls.ENCODINGS.values():
+            if path.endswith(suffix):
+                uncompressed_path = path[:-len(suffix)]
+                if stat_cache is None:
+                    return os.path.isfile(uncompressed_path)
+                return uncompressed_path in stat_cache
+        return False
+
+    def get_static_file(self, path, url, stat_cache=None):
+        # As WhiteNoise's, with zstd among the encodings
+        if stat_cache is None and not os.path.exists(path):
+            raise responders.MissingFileError(path)
+        headers = Headers([])
+        self.add_mime_headers(headers, path, url)
+        self.add_cache_headers(headers, path, url)
+        if self.allow_all_origins:
+            headers['Access-Control-Allow-Origin'] = '*'
+        if self.add_headers_function is not None:
+            self.add_headers_function(headers, path, url)
+        return responders.StaticFile(
+            path,
+            headers.items(),
+            stat_cache=stat_cache,
+            encodings={encoding: path + suffix for encoding, suffix in self.ENCODINGS.items()},
+        )
@@ -0,0 +1,236 @@
+"""
+Surrogate keys for shared caches in front of the site.
+
+Responses carry a ``Surrogate-Key`` header listing what they were built
+from: the Wagtail page (``page-7``) and every product, brand, partner and
+category in the template context (``product-12``, ``brand-3``, ...), plus
+``<type>-list`` for pages that list a type. Listings whose HTML came from
+a cached fragment are only tagged by type, so saving or deleting an
+object purges both its own key and its type's list key. Publishing a page
+purges its page key. Purges go through the backends configured in
+``SURROGATE_PURGE_BACKENDS``::
+
+    SURROGATE_PURGE_BACKENDS = {
+        'varnish': {
+            'BACKEND': 'business.surrogate.HTTPPurgeBackend',
+            'LOCATION': 'http://localhost:6081/',
+        },
+    }
+
+``ProxySimulatorBackend`` purges an in-process ``ProxySimulator``, a small
+stand-in for an nginx proxy cache that can be driven with the test client.
+"""
+import logging
+import time
+from collections import defaultdict
+
+import requests
+from django.conf import settings
+from django.core.paginator import Page as PaginatorPage
+from django.db import models, transaction
+from django.utils.cache import get_max_age
+from django.utils.module_loading import import_string
+
+from .middleware import HybridMiddleware
+from .models import Brand, Partner, Product, ProductCategory
+
+
+logger = logging.getLogger(__name__)
+
+# Models tagged on responses, and the key prefix for each
+SURROGATE_KEY_PREFIXES = {
+    Product: 'product',
+    Brand: 'brand',
+    Partner: 'partner',
+    ProductCategory: 'category',
+}
+
+# Foreign keys whose targets are shown with an object, e.g. a product card
+# shows its brand and category names
+SURROGATE_KEY_RELATIONS = {
+    Product: [('brand_id', 'brand'), ('category_id', 'category')],
+    Brand: [('partner_id', 'partner')],
+}
+
+
+def object_keys(obj):
+    keys = {f"{SURROGATE_KEY_PREFIXES[type(obj)]}-{obj.pk}"}
+    for attname, prefix in SURROGATE_KEY_RELATIONS.get(type(obj), []):
+        if getattr(obj, attname) is not None:
+            keys.add(f"{prefix}-{getattr(obj, attname)}")
+    return keys
+
+
+def list_keys(model):
+    """Keys for a listing of ``model``, including the types shown with it"""
+    keys = {f"{SURROGATE_KEY_PREFIXES[model]}-list"}
+    for attname, prefix in SURROGATE_KEY_RELATIONS.get(model, []):
+        keys.add(f"{prefix}-list")
+    return keys
+
+
+def context_keys(context):
+    """Surrogate keys for the tagged objects found in a template context"""
+    keys = set()
+    for value in context.values():
+        if isinstance(value, PaginatorPage):
+            value = value.object_list
+        if isinstance(value, models.QuerySet):
+            if value._result_cache is None:
+                # Not iterated, e.g. its fragment came from the cache; the
+                # page still shows objects of this type
+                if value.model in SURROGATE_KEY_PREFIXES:
+                    keys |= list_keys(value.model)
+                continue
+            value = value._result_cache
+        if isinstance(value, (list, tuple)):
+            objects = [obj for obj in value if type(obj) in SURROGATE_KEY_PREFIXES]
+            if objects:
+                keys |= list_keys(type(objects[0]))
+        elif type(value) in SURROGATE_KEY_PREFIXES:
+            objects = [value]
+        else:
+            continue
+        for obj in objects:
+            keys |= object_keys(obj)
+    return keys
+
+
+def add_surrogate_keys(request, keys):
+    """Tag the response to ``request`` with extra keys"""
+    if hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys.update(keys)
+
+
+class SurrogateKeyMiddleware(HybridMiddleware):
+    """Collect surrogate keys while a response is built and send them as a header"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.header = getattr(settings, 'SURROGATE_KEY_HEADER', 'Surrogate-Key')
+
+    def process_request(self, request):
+        request.surrogate_keys = set()
+
+    def process_response(self, request, response):
+        keys = request.surrogate_keys
+        context = getattr(response, 'context_data', None)
+        if context:
+            keys |= context_keys(context)
+        if keys and not response.has_header(self.header):
+            response[self.header] = ' '.join(sorted(keys))
+        return response
+
+
+# Purging
+
+class BasePurgeBackend:
+    def __init__(self, params):
+        self.params = params
+
+    def purge(self, keys):
+        raise NotImplementedError
+
+
+class HTTPPurgeBackend(BasePurgeBackend):
+    """
+    Send one request listing the keys in a header, as Varnish (xkey),
+    nginx cache purge modules and most CDNs accept. Options: ``LOCATION``,
+    ``METHOD`` (PURGE), ``HEADER`` (Surrogate-Key), ``HEADERS`` for API
+    tokens, ``TIMEOUT`` (5 seconds).
+    """
+
+    def purge(self, keys):
+        headers = dict(self.params.get('HEADERS', {}))
+        headers[self.params.get('HEADER', 'Surrogate-Key')] = ' '.join(keys)
+        try:
+            response = requests.request(
+                self.params.get('METHOD', 'PURGE'),
+                self.params['LOCATION'],
+                headers=headers,
+                timeout=self.params.get('TIMEOUT', 5),
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.error("Couldn't purge %s from %s: %s", ' '.join(keys), self.params['LOCATION'], e)
+
+
+class ProxySimulator:
+    """
+    In-process stand-in for an nginx proxy cache with purge by key.
+
+    ``get()`` serves a path through a Django test client the way a shared
+    cache would: fresh stored copies are returned without reaching Django,
+    and 200 responses marked public with a max-age are stored and indexed
+    by their surrogate keys. ``X-Cache`` on the result says HIT or MISS.
+    """
+
+    def __init__(self, header='Surrogate-Key'):
+        self.header = header
+        self.clear()
+
+    def clear(self):
+        self.entries = {}
+        self.paths_by_key = defaultdict(set)
+        self.hits = self.misses = 0
+
+    def get(self, client, path, **extra):
+        entry = self.entries.get(path)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            response = entry[1]
+            response['X-Cache'] = 'HIT'
+            return response
+
+        self.misses += 1
+        response = client.get(path, **extra)
+        if self.is_storable(response):
+            self.entries[path] = (time.monotonic() + get_max_age(response), response)
+            for key in response.get(self.header, '').split():
+                self.paths_by_key[key].add(path)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def is_storable(self, response):
+        cache_control = response.get('Cache-Control', '')
+        return (
+            response.status_code == 200
+            and 'public' in cache_control
+            and not response.cookies
+            and (get_max_age(response) or 0) > 0
+        )
+
+    def purge(self, keys):
+        for key in keys:
+            for path in self.paths_by_key.pop(key, ()):
+                self.entries.pop(path, None)
+
+
+proxy_simulator = ProxySimulator()
+
+
+class ProxySimulatorBackend(BasePurgeBackend):
+    """Purge ``proxy_simulator``"""
+
+    def purge(self, keys):
+        proxy_simulator.purge(keys)
+
+
+def get_purge_backends():
+    return [
+        import_string(params['BACKEND'])(params)
+        for params in getattr(settings, 'SURROGATE_PURGE_BACKENDS', {}).values()
+    ]
+
+
+def purge_surrogate_keys(keys):
+    """Purge ``keys`` from every configured backend once the transaction commits"""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+
+    def purge():
+        for backend in get_purge_backends():
+            backend.purge(keys)
+
+    transaction.on_commit(purge)
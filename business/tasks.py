@@ -0,0 +1,43 @@
+"""
+Background tasks.
+
+Tasks run on the backend configured in ``TASKS`` (django-tasks). The
+default ImmediateBackend runs them as soon as they are enqueued; with
+``TASKS_BACKEND=django_tasks.backends.database.DatabaseBackend`` they are
+stored and run by ``python manage.py db_worker``, so a request only waits
+for the row to be written.
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+from django_tasks import DEFAULT_TASK_BACKEND_ALIAS, task, tasks
+from django_tasks.backends.immediate import ImmediateBackend
+from wagtail.models import Page
+
+from .warmup import page_targets, warm_site
+
+
+CONTACT_RECIPIENTS = ['azan@sweetbliss.pk']
+
+
+def runs_in_background():
+    """Whether enqueued tasks run in a worker rather than in the enqueuing request"""
+    return not isinstance(tasks[DEFAULT_TASK_BACKEND_ALIAS], ImmediateBackend)
+
+
+@task()
+def send_contact_email(subject, body):
+    """Send a contact form submission to the Sweet Bliss inbox"""
+    send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, CONTACT_RECIPIENTS, fail_silently=False)
+
+
+@task()
+def warm_published_page(page_id):
+    """Render a newly published page and its parent, and their category listings"""
+    page = Page.objects.live().filter(pk=page_id).specific().first()
+    if page is None:
+        return 0
+    targets = page_targets(page)
+    parent = page.get_parent()
+    if parent is not None and parent.live:
+        targets += page_targets(parent.specific)
+    return len(warm_site(targets, concurrency=1))
@@ -0,0 +1,24 @@
+from django import template
+
+from business.critical_css import render_stylesheets
+from business.static_assets import render_picture
+
+register = template.Library()
+
+
+@register.filter
+def nav_section(path):
+    """First segment of a URL path, e.g. "products" for /products/kitkat/"""
+    return path.strip('/').split('/', 1)[0]
+
+
+@register.simple_tag(takes_context=True)
+def critical_css(context, *stylesheets):
+    """Page stylesheets, with this page type's critical CSS inlined"""
+    return render_stylesheets(context, stylesheets)
+
+
+@register.simple_tag
+def static_picture(path, **attrs):
+    """A static image, with its AVIF and WebP variants where collectstatic made them"""
+    return render_picture(path, attrs)
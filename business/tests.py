@@ -1,3 +1,1091 @@
-from django.test import TestCase
+import io
+import os
+import runpy
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django_tasks import DEFAULT_TASK_BACKEND_ALIAS, tasks
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from openpyxl import Workbook
+from wagtail.models import Page, Site
+
+from . import critical_css
+from .catalogue import CatalogueImporter, rebuild_spec_values, reconcile_product_counts
+from .html import CompressionMiddleware, HTMLMinifier, minify_html
+from .models import (
+    Brand, CatalogueChange, Partner, Product, ProductCategory, ProductSpecValue, ProductsPage, RelatedProduct,
+    SearchIndexUpdate, TeamMember, product_slugs,
+)
+from .recommendations import build_recommendations
+from . import replicas
+from .routing import page_routes
+from . import search_index
+from .search_cache import LRUCache, normalize_query, search_cache
+from .signals import warm_on_publish
+from .surrogate import list_keys, object_keys, proxy_simulator
+from .versions import ContentVersions
+from .warmup import fetch
+from seo.models import GlobalSEOSettings
+
+
+# Templates link static files that aren't collected into a manifest here
+PLAIN_STATIC_FILES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def workbook(*rows):
+    """An .xlsx file holding ``rows``, the first being the header"""
+    book = Workbook()
+    for row in rows:
+        book.active.append(row)
+    file = io.BytesIO()
+    book.save(file)
+    file.seek(0)
+    return file
+
+
+class CatalogueImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='KitKat')
+        cls.category = ProductCategory.objects.create(name='Chocolates')
+        cls.product = Product.objects.create(
+            name='4-Finger Bar', slug='kitkat-4finger', brand=cls.brand, category=cls.category,
+            specifications={'weight': '41.5g'},
+        )
+
+    def run_import(self, *rows, **kwargs):
+        return CatalogueImporter(**kwargs).run(workbook(['name', 'brand', 'category', *rows[0]], *rows[1:]))
+
+    def test_row_without_slug_updates_the_product_with_its_brand_and_name(self):
+        stats = self.run_import(['description'], ['4-Finger Bar', 'KitKat', 'Chocolates', 'Crispy wafer'])
+
+        self.assertEqual(stats['updated'], 1)
+        self.assertEqual(Product.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.description, 'Crispy wafer')
+
+    def test_new_product_gets_a_slug_from_brand_and_name(self):
+        stats = self.run_import([], ['Chunky', 'KitKat', 'Chocolates'])
+
+        self.assertEqual(stats['created'], 1)
+        self.assertTrue(Product.objects.filter(slug='kitkat-chunky', name='Chunky').exists())
+
+    def test_generated_slug_taken_by_another_product_gets_a_suffix(self):
+        Product.objects.create(name='Other', slug='kitkat-chunky', brand=self.brand, category=self.category)
+
+        self.run_import([], ['Chunky', 'KitKat', 'Chocolates'])
+
+        self.assertEqual(Product.objects.get(name='Chunky').slug, 'kitkat-chunky-2')
+
+    def test_importing_twice_doesnt_duplicate_products(self):
+        for _ in range(2):
+            self.run_import([], ['Chunky', 'KitKat', 'Chocolates'])
+
+        self.assertEqual(Product.objects.filter(name='Chunky').count(), 1)
+
+    def test_explicit_slug_wins_over_brand_and_name(self):
+        self.run_import(['slug'], ['4-Finger Bar', 'KitKat', 'Chocolates', 'kitkat-4finger-2'])
+
+        self.assertEqual(Product.objects.filter(name='4-Finger Bar').count(), 2)
+
+    def test_spec_columns_are_merged_and_specifications_replaced(self):
+        self.run_import(['spec.flavour'], ['4-Finger Bar', 'KitKat', 'Chocolates', 'milk'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.specifications, {'weight': '41.5g', 'flavour': 'milk'})
+
+        self.run_import(['specifications'], ['4-Finger Bar', 'KitKat', 'Chocolates', '{"weight": "45g"}'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.specifications, {'weight': '45g'})
+
+    def test_specifications_that_arent_an_object_skip_the_row(self):
+        stats = self.run_import(['specifications'], ['4-Finger Bar', 'KitKat', 'Chocolates', '[1]'])
+
+        self.assertEqual(stats['skipped'], 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.specifications, {'weight': '41.5g'})
+
+    def test_dry_run_writes_nothing(self):
+        stats = self.run_import([], ['Chunky', 'KitKat', 'Chocolates'], dry_run=True)
+
+        self.assertEqual(stats['created'], 1)
+        self.assertFalse(Product.objects.filter(name='Chunky').exists())
+
+
+class RecommendationTests(TestCase):
+    def test_products_sharing_brand_category_and_words_rank_first(self):
+        chocolates = ProductCategory.objects.create(name='Chocolates')
+        drinks = ProductCategory.objects.create(name='Drinks')
+        kitkat = Brand.objects.create(name='KitKat')
+        rani = Brand.objects.create(name='Rani')
+        products = {
+            name: Product.objects.create(
+                name=name, slug=name.lower().replace(' ', '-'), brand=brand, category=category,
+                description=description,
+            )
+            for name, brand, category, description in [
+                ('Chunky', kitkat, chocolates, 'chunky milk chocolate wafer bar'),
+                ('Four Finger', kitkat, chocolates, 'four finger milk chocolate wafer'),
+                ('Mango Can', rani, drinks, 'mango juice with real pulp'),
+                ('Peach Can', rani, drinks, 'peach juice with real pulp'),
+            ]
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(build_recommendations(top_k=2), 4)
+
+        self.assertEqual(products['Chunky'].related_products(1)[0], products['Four Finger'])
+        self.assertEqual(products['Mango Can'].related_products(1)[0], products['Peach Can'])
+
+    def test_rebuilding_invalidates_cached_product_pages(self):
+        key = ProductsPage.product_cache_key(1, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            build_recommendations()
+
+        self.assertNotEqual(ProductsPage.product_cache_key(1, 1), key)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Checks PostgreSQL query plans")
+class QueryIndexTests(TestCase):
+    """The hot catalogue queries can be answered from the indexes of migration 0006"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ProductCategory.objects.bulk_create(
+            [ProductCategory(name=f'Category {number}') for number in range(50)]
+        )
+        brands = Brand.objects.bulk_create([Brand(name=f'Brand {number}') for number in range(20)])
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {number}', slug=f'product-{number}',
+                brand=brands[number % 20], category=categories[number % 50],
+                is_active=number % 10 != 0, is_featured=number % 101 == 0,
+            )
+            for number in range(5000)
+        ], batch_size=1000)
+        Partner.objects.bulk_create([
+            Partner(name=f'Partner {number}', order=number, is_active=number % 4 != 0) for number in range(100)
+        ])
+        TeamMember.objects.bulk_create([
+            TeamMember(name=f'Member {number}', position='Sales', order=number, is_active=number % 4 != 0)
+            for number in range(100)
+        ])
+        cls.category = categories[3]
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # Seeded tables are small enough that a sequential scan is
+            # cheapest; what matters is that an index can serve the query
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_active_products_by_date(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True).order_by('-created_at')[:12], 'product_active_created_idx',
+        )
+
+    def test_active_products_of_a_category(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True, category=self.category).order_by('-created_at')[:12],
+            'product_active_category_idx',
+        )
+
+    def test_featured_products(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True, is_featured=True).order_by('-created_at')[:6],
+            'product_featured_created_idx',
+        )
+
+    def test_category_and_brand_by_name(self):
+        self.assertUsesIndex(ProductCategory.objects.filter(name__iexact='category 3'), 'category_name_upper_idx')
+        self.assertUsesIndex(Brand.objects.filter(name__iexact='brand 3'), 'brand_name_upper_idx')
+
+    def test_active_partners_and_team_members_in_order(self):
+        self.assertUsesIndex(
+            Partner.objects.filter(is_active=True).order_by('order', 'name'), 'partner_active_order_idx',
+        )
+        self.assertUsesIndex(
+            TeamMember.objects.filter(is_active=True).order_by('order', 'name'), 'teammember_active_order_idx',
+        )
+
+
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='KitKat')
+        cls.category = ProductCategory.objects.create(name='Chocolates')
+
+    def setUp(self):
+        self.since = CatalogueChange.objects.order_by('pk').values_list('pk', flat=True).last() or 0
+
+    def feed(self, **params):
+        response = self.client.get(reverse('business:change_feed'), {'since': self.since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def create_product(self, name='Chunky', **fields):
+        return Product.objects.create(
+            name=name, slug=f"kitkat-{name.lower()}", brand=self.brand, category=self.category, **fields,
+        )
+
+    def test_lists_changes_after_the_cursor_with_current_data(self):
+        product = self.create_product()
+
+        feed = self.feed()
+
+        self.assertEqual(feed['cursor'], CatalogueChange.objects.latest('pk').pk)
+        self.assertFalse(feed['has_more'])
+        self.assertEqual(
+            [(change['model'], change['id'], change['action']) for change in feed['changes']],
+            [('product', product.pk, 'insert')],
+        )
+        self.assertEqual(feed['changes'][0]['data']['name'], 'Chunky')
+
+    def test_collapses_changes_to_the_latest_per_object(self):
+        product = self.create_product()
+        product.name = 'Chunky Peanut'
+        product.save()
+
+        changes = self.feed()['changes']
+
+        self.assertEqual([(change['id'], change['action']) for change in changes], [(product.pk, 'update')])
+        self.assertEqual(changes[0]['data']['name'], 'Chunky Peanut')
+
+    def test_deleted_and_deactivated_products_are_deletes(self):
+        deleted = self.create_product('Chunky')
+        deactivated = self.create_product('Senses')
+        deleted_pk = deleted.pk
+        deleted.delete()
+        deactivated.is_active = False
+        deactivated.save()
+
+        changes = self.feed()['changes']
+
+        self.assertEqual(
+            [(change['id'], change['action'], change['data']) for change in changes],
+            [(deleted_pk, 'delete', None), (deactivated.pk, 'delete', None)],
+        )
+
+    def test_pages_follow_the_cursor(self):
+        products = [self.create_product(name) for name in ('Chunky', 'Senses', 'Bites')]
+
+        first = self.feed(limit=2)
+        self.since = first['cursor']
+        second = self.feed(limit=2)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [change['id'] for change in first['changes'] + second['changes']],
+            [product.pk for product in products],
+        )
+        self.since = second['cursor']
+        self.assertEqual(self.feed()['changes'], [])
+
+    def test_is_never_cached(self):
+        response = self.client.get(reverse('business:change_feed'))
+
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_rejects_a_cursor_that_isnt_an_integer(self):
+        response = self.client.get(reverse('business:change_feed'), {'since': 'x'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class HTMLMinifierTests(SimpleTestCase):
+    def test_collapses_whitespace_and_drops_comments(self):
+        self.assertEqual(
+            minify_html('<div>\n\n   <p>Sweet   Bliss</p><!-- nav -->  </div>'),
+            '<div>\n<p>Sweet Bliss</p> </div>',
+        )
+
+    def test_keeps_conditional_comments(self):
+        self.assertEqual(minify_html('<!--[if IE]><p>Old</p><![endif]-->'), '<!--[if IE]><p>Old</p><![endif]-->')
+
+    def test_leaves_raw_elements_as_rendered(self):
+        html = '<pre>  a\n   b  </pre><script type="application/ld+json">{"a":  1}</script><textarea> x  </textarea>'
+
+        self.assertEqual(minify_html(html), html)
+
+    def test_leaves_quoted_attribute_values_alone(self):
+        html = '<a title="a > b   c" data-x=\'1  > 0\'>link</a>'
+
+        self.assertEqual(minify_html(html), html)
+
+    def test_less_than_sign_in_text(self):
+        self.assertEqual(minify_html('<p>1 <  2   and 3 >   2</p>'), '<p>1 < 2 and 3 > 2</p>')
+
+    def test_chunks_minify_like_the_whole_page(self):
+        html = (
+            '<html>  <head><title> A </title></head>\n<body class="x  y">'
+            '<p title="a > b">text   <b>bold</b></p><pre> keep  </pre><!-- gone --> 1 < 2 </body></html>'
+        )
+        for size in (1, 2, 5, 17):
+            minifier = HTMLMinifier()
+            chunks = [minifier.feed(html[start:start + size]) for start in range(0, len(html), size)]
+            self.assertEqual(''.join(chunks) + minifier.close(), minify_html(html), size)
+
+
+class CompressionNegotiationTests(SimpleTestCase):
+    def negotiate(self, accept_encoding):
+        middleware = CompressionMiddleware(lambda request: HttpResponse())
+        return middleware.negotiate(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_prefers_brotli(self):
+        self.assertEqual(self.negotiate('gzip, deflate, br'), 'br')
+
+    def test_follows_q_values(self):
+        self.assertEqual(self.negotiate('br;q=0.5, gzip'), 'gzip')
+
+    def test_rejects_encodings_with_q_zero(self):
+        self.assertEqual(self.negotiate('br;q=0, gzip'), 'gzip')
+        self.assertIsNone(self.negotiate('br;q=0, gzip;q=0'))
+        self.assertIsNone(self.negotiate('identity'))
+
+    def test_wildcard(self):
+        self.assertEqual(self.negotiate('*'), 'br')
+        self.assertEqual(self.negotiate('br;q=0, *;q=0.5'), 'gzip')
+
+
+class CompressionTests(SimpleTestCase):
+    def respond(self, path, **extra):
+        response = HttpResponse('<p>' + 'x' * 1000 + '</p>')
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING='gzip', **extra)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compresses_public_pages(self):
+        self.assertEqual(self.respond('/products/')['Content-Encoding'], 'gzip')
+
+    def test_leaves_the_admin_and_csrf_protected_pages_uncompressed(self):
+        for path in ('/admin/', '/django-admin/login/'):
+            self.assertFalse(self.respond(path).has_header('Content-Encoding'), path)
+        self.assertFalse(self.respond('/contact/', CSRF_COOKIE_USED=True).has_header('Content-Encoding'))
+
+
+class ContactFormTests(TestCase):
+    def post(self, body):
+        return self.client.post(reverse('business:contact_form'), body, content_type='application/json')
+
+    def test_sends_the_message(self):
+        response = self.post({'name': 'Ali', 'email': 'ali@example.com', 'message': 'Hello'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+    def test_rejects_bodies_that_arent_a_json_object(self):
+        for body in ('not json', '[1]', '"x"', '1'):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertFalse(response.json()['success'])
+
+    def test_requires_name_email_and_message(self):
+        response = self.post({'name': 'Ali', 'email': 'ali@example.com'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class WarmupTests(TestCase):
+    def test_fetch_leaves_request_signals_alone(self):
+        # fetch() closes its thread's connections, here the test's own
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        receivers = (list(request_started.receivers), list(request_finished.receivers))
+
+        with mock.patch('business.warmup.connections'):
+            status, _ = fetch(('localhost', reverse('business:contact_form')))
+
+        self.assertEqual(status, 405)
+        self.assertEqual((request_started.receivers, request_finished.receivers), receivers)
+
+    @override_settings(WARM_ON_PUBLISH=None)
+    def test_publishing_warms_only_with_a_background_backend(self):
+        page = Page.objects.first()
+        with self.captureOnCommitCallbacks() as callbacks:
+            warm_on_publish(Page, page)
+        self.assertEqual(callbacks, [])
+
+        with override_settings(WARM_ON_PUBLISH=True), self.captureOnCommitCallbacks() as callbacks:
+            warm_on_publish(Page, page)
+        self.assertEqual(len(callbacks), 1)
+
+
+@mock.patch('business.replicas.replica_aliases', return_value=[DEFAULT_DB_ALIAS])
+class ReplicaTests(TestCase):
+    """The default database stands in as its own replica"""
+
+    def setUp(self):
+        search_cache.local.clear()
+        replicas.monitor.checked.clear()
+        self.addCleanup(setattr, replicas, 'fenced_until', 0)
+
+    def middleware(self, view):
+        return replicas.ReplicaMiddleware(view)
+
+    def test_routes_public_reads_to_a_replica(self, aliases):
+        state = replicas.ReplicaMiddleware(None).route(RequestFactory().get('/products/'))
+        self.assertEqual(state.replica, DEFAULT_DB_ALIAS)
+
+        token = replicas.routing.set(state)
+        try:
+            router = replicas.ReplicaRouter()
+            self.assertEqual(router.db_for_read(Product), DEFAULT_DB_ALIAS)
+            self.assertIsNone(router.db_for_read(Session))
+            state.written = True
+            self.assertIsNone(router.db_for_read(Product))
+        finally:
+            replicas.routing.reset(token)
+
+    def test_admin_posts_and_sticky_clients_read_from_the_primary(self, aliases):
+        factory = RequestFactory()
+        sticky = factory.get('/products/')
+        sticky.COOKIES['use_primary'] = '1'
+        for request in (factory.get('/admin/'), factory.post('/products/'), sticky):
+            self.assertIsNone(replicas.ReplicaMiddleware(None).route(request).replica, request)
+
+    def test_only_model_writes_count(self, aliases):
+        self.assertTrue(replicas.is_model_write('UPDATE "business_product" SET "name" = %s'))
+        self.assertTrue(replicas.is_model_write('INSERT INTO "django_session" ("session_key") VALUES (%s)'))
+        self.assertFalse(replicas.is_model_write('INSERT INTO "django_cache" (cache_key) VALUES (%s)'))
+        self.assertFalse(replicas.is_model_write('DELETE FROM "django_cache" WHERE cache_key = %s'))
+        self.assertFalse(replicas.is_model_write('SELECT 1 FROM "business_product"'))
+
+    def test_a_write_sets_the_cookie_and_fences_the_replicas(self, aliases):
+        def view(request):
+            Brand.objects.create(name='Fenced')
+            response = HttpResponse()
+            response['Cache-Control'] = 'public, max-age=300'
+            return response
+
+        with connection.execute_wrapper(replicas.record_writes), self.captureOnCommitCallbacks(execute=True):
+            response = self.middleware(view)(RequestFactory().get('/products/'))
+
+        self.assertIn('use_primary', response.cookies)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertTrue(replicas.primary_required())
+        self.assertIsNone(replicas.ReplicaMiddleware(None).route(RequestFactory().get('/')).replica)
+
+    def test_caching_a_search_is_not_a_write(self, aliases):
+        with connection.execute_wrapper(replicas.record_writes), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('business:product_search'), {'q': 'kit'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('use_primary', response.cookies)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertFalse(replicas.primary_required())
+
+    def test_runs_inside_the_fast_path(self, aliases):
+        from django.conf import settings
+        self.assertLess(
+            settings.MIDDLEWARE.index('business.middleware.FastPathMiddleware'),
+            settings.MIDDLEWARE.index('business.replicas.ReplicaMiddleware'),
+        )
+
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class ProductDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.page = Site.objects.get(is_default_site=True).root_page.add_child(
+            instance=ProductsPage(title='Products', slug='products'),
+        )
+        cls.brand = Brand.objects.create(name='KitKat')
+        cls.category = ProductCategory.objects.create(name='Chocolates')
+        cls.bar = Product.objects.create(
+            name='4-Finger Bar', slug='kitkat-4finger', brand=cls.brand, category=cls.category,
+            description='Crispy wafer',
+        )
+        cls.chunky = Product.objects.create(
+            name='Chunky', slug='kitkat-chunky', brand=cls.brand, category=cls.category,
+        )
+        RelatedProduct.objects.create(product=cls.chunky, related=cls.bar, rank=1, score=0.9)
+
+    def setUp(self):
+        product_slugs.clear()
+
+    def get(self, slug):
+        return self.client.get(f'{self.page.url}{slug}/')
+
+    def test_serves_active_products_by_slug(self):
+        response = self.get('kitkat-4finger')
+
+        self.assertContains(response, 'Crispy wafer')
+        self.assertContains(response, f'href="{self.page.full_url}kitkat-4finger/"')
+        self.assertEqual(self.get('no-such-product').status_code, 404)
+
+    def test_saving_a_product_moves_its_slug_and_drops_its_page(self):
+        self.get('kitkat-4finger')
+        self.bar.slug = 'kitkat-four-finger'
+        self.bar.description = 'Four fingers'
+        self.bar.save()
+
+        self.assertEqual(self.get('kitkat-4finger').status_code, 404)
+        self.assertContains(self.get('kitkat-four-finger'), 'Four fingers')
+
+        self.bar.is_active = False
+        self.bar.save()
+        self.assertEqual(self.get('kitkat-four-finger').status_code, 404)
+
+    def test_importing_drops_cached_pages(self):
+        self.assertContains(self.get('kitkat-4finger'), 'Crispy wafer')
+
+        CatalogueImporter().run(workbook(
+            ['name', 'brand', 'category', 'description', 'is_active'],
+            ['4-Finger Bar', 'KitKat', 'Chocolates', 'Now with more wafer', 'yes'],
+        ))
+        self.assertContains(self.get('kitkat-4finger'), 'Now with more wafer')
+
+        CatalogueImporter().run(workbook(
+            ['name', 'brand', 'category', 'is_active'], ['4-Finger Bar', 'KitKat', 'Chocolates', 'no'],
+        ))
+        self.assertEqual(self.get('kitkat-4finger').status_code, 404)
+
+    def test_editing_a_related_product_drops_the_pages_showing_it(self):
+        self.assertContains(self.get('kitkat-chunky'), '4-Finger Bar')
+
+        self.bar.name = 'Four Finger Bar'
+        self.bar.save()
+
+        self.assertContains(self.get('kitkat-chunky'), 'Four Finger Bar')
+
+    def test_seo_settings_change_the_cache_key(self):
+        key = ProductsPage.product_cache_key(self.page.pk, self.bar.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GlobalSEOSettings.for_site(Site.objects.get(is_default_site=True)).save()
+
+        self.assertNotEqual(ProductsPage.product_cache_key(self.page.pk, self.bar.pk), key)
+
+    def test_slug_index_updates_in_bulk(self):
+        self.assertEqual(product_slugs.get('kitkat-4finger'), self.bar.pk)
+        self.bar.slug, self.chunky.is_active = 'kitkat-bar', False
+
+        product_slugs.update_many([self.bar, self.chunky])
+
+        self.assertEqual(product_slugs.ids, {'kitkat-bar': self.bar.pk})
+
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class HeaderFragmentTests(TestCase):
+    def header_key(self):
+        request = RequestFactory().get('/products/')
+        with mock.patch('django.templatetags.cache.make_template_fragment_key', wraps=make_template_fragment_key) as make_key:
+            render_to_string('includes/header.html', {'request': request, 'content_version': ContentVersions()})
+        return make_key.call_args.args
+
+    def test_publishing_pages_changes_the_key(self):
+        key = self.header_key()
+        self.assertEqual(key, self.header_key())
+        home = Site.objects.get(is_default_site=True).root_page
+
+        with self.captureOnCommitCallbacks(execute=True):
+            page = home.add_child(instance=ProductsPage(title='Offers', slug='offers', live=False))
+            page.save_revision().publish()
+
+        self.assertNotEqual(self.header_key(), key)
+
+    def test_seo_settings_change_the_key(self):
+        key = self.header_key()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GlobalSEOSettings.for_site(Site.objects.get(is_default_site=True)).save()
+
+        self.assertNotEqual(self.header_key(), key)
+
+
+@override_settings(
+    STORAGES=PLAIN_STATIC_FILES, PUBLIC_FAST_PATH=True,
+    SURROGATE_PURGE_BACKENDS={'sim': {'BACKEND': 'business.surrogate.ProxySimulatorBackend'}},
+)
+class SurrogateKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.page = Site.objects.get(is_default_site=True).root_page.add_child(
+            instance=ProductsPage(title='Products', slug='products'),
+        )
+        cls.partner = Partner.objects.create(name='Nestlé')
+        cls.kitkat = Brand.objects.create(name='KitKat', partner=cls.partner)
+        cls.rani = Brand.objects.create(name='Rani')
+        cls.chocolates = ProductCategory.objects.create(name='Chocolates')
+        cls.drinks = ProductCategory.objects.create(name='Drinks')
+        cls.bar = Product.objects.create(name='4-Finger Bar', slug='kitkat-4finger', brand=cls.kitkat, category=cls.chocolates)
+        cls.can = Product.objects.create(name='Mango Can', slug='rani-mango', brand=cls.rani, category=cls.drinks)
+
+    def setUp(self):
+        product_slugs.clear()
+        proxy_simulator.clear()
+        self.bar_path = f'{self.page.url}kitkat-4finger/'
+        self.can_path = f'{self.page.url}rani-mango/'
+
+    def fetch(self, path):
+        return proxy_simulator.get(self.client, path)['X-Cache']
+
+    def test_object_and_list_keys(self):
+        self.assertEqual(
+            object_keys(self.bar),
+            {f'product-{self.bar.pk}', f'brand-{self.kitkat.pk}', f'category-{self.chocolates.pk}'},
+        )
+        self.assertEqual(object_keys(self.kitkat), {f'brand-{self.kitkat.pk}', f'partner-{self.partner.pk}'})
+        self.assertEqual(object_keys(self.rani), {f'brand-{self.rani.pk}'})
+        self.assertEqual(list_keys(Product), {'product-list', 'brand-list', 'category-list'})
+        self.assertEqual(list_keys(Partner), {'partner-list'})
+
+    def test_pages_are_tagged_and_stored(self):
+        response = proxy_simulator.get(self.client, self.bar_path)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        keys = set(response['Surrogate-Key'].split())
+        self.assertLessEqual(object_keys(self.bar) | object_keys(self.kitkat) | {f'page-{self.page.pk}'}, keys)
+        self.assertNotIn(f'product-{self.can.pk}', keys)
+        self.assertEqual(self.fetch(self.bar_path), 'HIT')
+
+    def test_saving_a_product_purges_only_its_pages(self):
+        self.fetch(self.bar_path)
+        self.fetch(self.can_path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bar.save()
+
+        self.assertEqual(self.fetch(self.bar_path), 'MISS')
+        self.assertEqual(self.fetch(self.can_path), 'HIT')
+
+    def test_saving_a_brand_purges_only_its_products_pages(self):
+        self.fetch(self.bar_path)
+        self.fetch(self.can_path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rani.save()
+
+        self.assertEqual(self.fetch(self.bar_path), 'HIT')
+        self.assertEqual(self.fetch(self.can_path), 'MISS')
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        search_cache.local.clear()
+        search_cache.forget_version()
+
+    def key(self, query, category='', brand='', specifications=None):
+        return async_to_sync(search_cache.key)(normalize_query(query), category, brand, specifications or {})
+
+    def test_queries_differing_in_case_and_spacing_share_a_key(self):
+        self.assertEqual(normalize_query('  kit   kat '), 'kit kat')
+        self.assertEqual(self.key('Kit  Kat', 'Chocolates'), self.key(' kit kat', 'chocolates'))
+        self.assertNotEqual(self.key('kit kat'), self.key('kit kat', brand='KitKat'))
+        self.assertEqual(
+            self.key('kit', specifications={'weight': '45g', 'flavour': 'milk'}),
+            self.key('kit', specifications={'flavour': 'milk', 'weight': '45g'}),
+        )
+
+    def test_version_is_read_once_per_interval(self):
+        self.key('kit')
+        with self.assertNumQueries(0):
+            self.key('kat')
+
+    def test_saving_a_product_changes_every_key(self):
+        key = self.key('kit')
+        brand = Brand.objects.create(name='KitKat')
+        category = ProductCategory.objects.create(name='Chocolates')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Chunky', slug='kitkat-chunky', brand=brand, category=category)
+
+        self.assertNotEqual(self.key('kit'), key)
+
+    def test_lru_evicts_the_least_recently_used(self):
+        lru = LRUCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+    def test_lru_entries_expire(self):
+        lru = LRUCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+
+        with mock.patch('business.search_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
+
+
+class ProductCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.nestle, cls.mondelez = Partner.objects.create(name='Nestlé'), Partner.objects.create(name='Mondelez')
+        cls.kitkat = Brand.objects.create(name='KitKat', partner=cls.nestle)
+        cls.oreo = Brand.objects.create(name='Oreo', partner=cls.mondelez)
+        cls.chocolates = ProductCategory.objects.create(name='Chocolates')
+        cls.biscuits = ProductCategory.objects.create(name='Biscuits')
+
+    def create(self, slug, **fields):
+        fields = {'brand': self.kitkat, 'category': self.chocolates, **fields}
+        return Product.objects.create(name=slug, slug=slug, **fields)
+
+    def assertCounts(self, *expected):
+        """Counts of KitKat, Oreo, Chocolates, Biscuits, Nestlé and Mondelez"""
+        actual = [
+            obj.__class__.objects.get(pk=obj.pk).active_product_count
+            for obj in (self.kitkat, self.oreo, self.chocolates, self.biscuits, self.nestle, self.mondelez)
+        ]
+        self.assertEqual(actual, list(expected))
+
+    def test_creating_counts_active_products_only(self):
+        self.create('chunky')
+        self.create('hidden', is_active=False)
+
+        self.assertCounts(1, 0, 1, 0, 1, 0)
+
+    def test_deactivating_and_reactivating(self):
+        product = self.create('chunky')
+        product.is_active = False
+        product.save()
+        self.assertCounts(0, 0, 0, 0, 0, 0)
+
+        product.is_active = True
+        product.save()
+        self.assertCounts(1, 0, 1, 0, 1, 0)
+
+    def test_moving_a_product_to_another_brand_and_category(self):
+        product = self.create('chunky')
+        product.brand, product.category = self.oreo, self.biscuits
+        product.save()
+
+        self.assertCounts(0, 1, 0, 1, 0, 1)
+
+    def test_moving_a_brand_to_another_partner(self):
+        self.create('chunky')
+        self.create('four-finger')
+        self.kitkat.partner = self.mondelez
+        self.kitkat.save()
+
+        self.assertCounts(2, 0, 2, 0, 0, 2)
+
+    def test_deleting(self):
+        self.create('chunky').delete()
+        self.create('hidden', is_active=False).delete()
+
+        self.assertCounts(0, 0, 0, 0, 0, 0)
+
+    def test_reconcile_fixes_drift(self):
+        self.create('chunky')
+        Product.objects.bulk_create([Product(name='Bulk', slug='bulk', brand=self.oreo, category=self.biscuits)])
+        Brand.objects.filter(pk=self.kitkat.pk).update(active_product_count=7)
+
+        corrected = reconcile_product_counts()
+
+        self.assertEqual(corrected, {ProductCategory: 1, Brand: 2, Partner: 1})
+        self.assertCounts(1, 1, 1, 1, 1, 1)
+        self.assertEqual(reconcile_product_counts(), {ProductCategory: 0, Brand: 0, Partner: 0})
+
+
+class SpecificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='KitKat')
+        category = ProductCategory.objects.create(name='Chocolates')
+        for slug, specifications in [
+            ('chunky', {'weight': '40g', 'pack': 24, 'vegan': False}),
+            ('bar', {'weight': '41.5g', 'pack': '24'}),
+            ('can', {'flavour': 'mango'}),
+        ]:
+            Product.objects.create(name=slug, slug=slug, brand=brand, category=category, specifications=specifications)
+
+    def setUp(self):
+        search_cache.local.clear()
+
+    def filtered(self, **specifications):
+        return sorted(Product.objects.with_specifications(specifications).values_list('slug', flat=True))
+
+    def catalogue(self):
+        return {
+            (key, value): count
+            for key, value, count in ProductSpecValue.objects.filter(product_count__gt=0).values_list(
+                'key', 'value', 'product_count',
+            )
+        }
+
+    def test_text_filters_match_numbers_and_booleans(self):
+        self.assertEqual(self.filtered(pack='24'), ['bar', 'chunky'])
+        self.assertEqual(self.filtered(vegan='false'), ['chunky'])
+        self.assertEqual(self.filtered(weight='40g', pack='24'), ['chunky'])
+        self.assertEqual(self.filtered(flavour='cherry'), [])
+
+    def test_api_filters_on_spec_parameters(self):
+        response = self.client.get(reverse('business:product-list'), {'spec.pack': '24', 'spec.bad key': 'x'})
+        self.assertEqual(sorted(product['slug'] for product in response.json()['results']), ['bar', 'chunky'])
+
+        response = self.client.get(reverse('business:product_search'), {'spec.weight': '41.5g'})
+        self.assertEqual([product['slug'] for product in response.json()], ['bar'])
+
+    def test_value_catalogue_lists_values_with_counts(self):
+        response = self.client.get(reverse('business:specification_values'), {'key': 'pack'})
+
+        self.assertEqual(response.json(), {'pack': [{'value': '24', 'count': 2}]})
+        self.assertEqual(self.catalogue(), {
+            ('flavour', 'mango'): 1, ('pack', '24'): 2, ('vegan', 'false'): 1,
+            ('weight', '40g'): 1, ('weight', '41.5g'): 1,
+        })
+
+    def test_value_catalogue_follows_saves_and_deletes(self):
+        chunky = Product.objects.get(slug='chunky')
+        chunky.specifications = {'weight': '45g', 'pack': 24}
+        chunky.save()
+        bar = Product.objects.get(slug='bar')
+        bar.is_active = False
+        bar.save()
+        Product.objects.get(slug='can').delete()
+
+        expected = {('pack', '24'): 1, ('weight', '45g'): 1}
+        self.assertEqual(self.catalogue(), expected)
+        rebuild_spec_values()
+        self.assertEqual(self.catalogue(), expected)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class PageRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.home = Site.objects.get(is_default_site=True).root_page
+        cls.products = cls.home.add_child(instance=ProductsPage(title='Products', slug='products'))
+        Product.objects.create(
+            name='Chunky', slug='kitkat-chunky',
+            brand=Brand.objects.create(name='KitKat'), category=ProductCategory.objects.create(name='Chocolates'),
+        )
+
+    def setUp(self):
+        page_routes.clear()
+        product_slugs.clear()
+
+    def route(self, path):
+        page, (view, args, kwargs), _ = page_routes.route(RequestFactory().get(f'/{path}'), path)
+        return page, view.__name__, kwargs
+
+    def test_resolves_pages_and_their_sub_routes(self):
+        self.assertEqual(self.route('products/'), (self.products, 'index_route', {}))
+        self.assertEqual(self.route('products/grid/'), (self.products, 'product_grid', {}))
+        self.assertEqual(self.route('products/kitkat-chunky/'), (self.products, 'product_detail', {'slug': 'kitkat-chunky'}))
+        with self.assertRaises(Http404):
+            page_routes.route(RequestFactory().get('/nowhere/'), 'nowhere/')
+
+    def test_serve_uses_the_table(self):
+        for path in ('products/', 'products/grid/', 'products/kitkat-chunky/'):
+            self.assertEqual(self.client.get(f'/{path}').status_code, 200, path)
+        self.assertIsNotNone(page_routes.table)
+        self.assertEqual(self.client.get('/products/no-such-product/').status_code, 404)
+
+    def test_publishing_clears_the_table(self):
+        page = self.home.add_child(instance=ProductsPage(title='Offers', slug='offers', live=False))
+        self.assertEqual(self.client.get('/offers/').status_code, 404)
+        self.assertIsNotNone(page_routes.table)
+
+        page.save_revision().publish()
+
+        self.assertIsNone(page_routes.table)
+        self.assertEqual(self.client.get('/offers/').status_code, 200)
+
+    def test_unpublishing_clears_the_table(self):
+        self.client.get('/products/')
+        self.products.unpublish()
+
+        self.assertIsNone(page_routes.table)
+        self.assertEqual(self.client.get('/products/').status_code, 404)
+
+    def test_moving_clears_the_table(self):
+        shop = self.home.add_child(instance=ProductsPage(title='Shop', slug='shop'))
+        self.client.get('/products/')
+        self.products.move(shop, pos='last-child')
+
+        self.assertIsNone(page_routes.table)
+        self.assertEqual(self.route('shop/products/grid/'), (self.products, 'product_grid', {}))
+        # Wagtail redirects the old path
+        self.assertRedirects(self.client.get('/products/'), '/shop/products/', 301, fetch_redirect_response=False)
+
+
+class RecordingSearchBackend:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.added, self.deleted = [], []
+
+    def add_bulk(self, model, objects):
+        if self.fail:
+            raise ConnectionError("search backend down")
+        self.added.append(sorted(obj.pk for obj in objects))
+
+    def delete(self, obj):
+        self.deleted.append(obj.pk)
+
+
+@override_settings(
+    TASKS={'default': {'BACKEND': 'django_tasks.backends.dummy.DummyBackend'}}, SEARCH_INDEX_DELAY=5,
+)
+class SearchIndexQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='KitKat')
+        cls.category = ProductCategory.objects.create(name='Chocolates')
+
+    def setUp(self):
+        # As business/signals.py connects them with a background backend
+        for signal in (post_save, post_delete):
+            signal.connect(search_index.queue_instance, sender=Product, dispatch_uid='test_search_index_queue')
+            self.addCleanup(signal.disconnect, sender=Product, dispatch_uid='test_search_index_queue')
+        cache.delete(search_index.SCHEDULED_KEY)
+        tasks[DEFAULT_TASK_BACKEND_ALIAS].clear()
+
+    def create(self, slug):
+        return Product.objects.create(name=slug, slug=slug, brand=self.brand, category=self.category)
+
+    def enqueued(self):
+        # Wagtail's own handlers stay connected in tests and enqueue theirs too
+        results = tasks[DEFAULT_TASK_BACKEND_ALIAS].results
+        return [result.task.name for result in results if result.task.name == 'update_search_index']
+
+    def test_saves_queue_each_object_once_and_schedule_one_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create('chunky')
+            product.save()
+            product.save()
+            self.create('four-finger')
+
+        self.assertEqual(
+            sorted(SearchIndexUpdate.objects.values_list('object_id', flat=True)),
+            sorted(str(pk) for pk in Product.objects.values_list('pk', flat=True)),
+        )
+        self.assertEqual(self.enqueued(), ['update_search_index'])
+
+    def test_a_waiting_run_isnt_scheduled_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            search_index.schedule_index_update()
+            search_index.schedule_index_update()
+        self.assertEqual(self.enqueued(), ['update_search_index'])
+
+        # The run releases the lock before indexing
+        with mock.patch('business.search_index.apply_queued_updates'):
+            search_index.update_search_index.call()
+        with self.captureOnCommitCallbacks(execute=True):
+            search_index.schedule_index_update()
+        self.assertEqual(self.enqueued(), ['update_search_index', 'update_search_index'])
+
+    def test_applies_the_queue_in_batches_and_removes_deleted_objects(self):
+        chunky, bar, gone = self.create('chunky'), self.create('bar'), self.create('gone')
+        gone_pk = gone.pk
+        gone.delete()
+        backend = RecordingSearchBackend()
+
+        with mock.patch('business.search_index.get_search_backends_with_name', return_value=[('default', backend)]):
+            totals = search_index.apply_queued_updates(batch_size=2)
+
+        self.assertEqual(totals, {'indexed': 2, 'removed': 1})
+        self.assertEqual(sorted(pk for batch in backend.added for pk in batch), sorted([chunky.pk, bar.pk]))
+        self.assertEqual(backend.deleted, [str(gone_pk)])
+        self.assertFalse(SearchIndexUpdate.objects.exists())
+
+    def test_failed_batches_stay_queued(self):
+        self.create('chunky')
+
+        with mock.patch(
+            'business.search_index.get_search_backends_with_name',
+            return_value=[('default', RecordingSearchBackend(fail=True))],
+        ), self.assertLogs('business.search_index', 'ERROR'):
+            self.assertEqual(search_index.apply_queued_updates(), {'indexed': 0, 'removed': 0})
+
+        self.assertEqual(SearchIndexUpdate.objects.count(), 1)
+
+
+DATABASE_ENV = [
+    'DATABASE_URL', 'DB_POOL', 'DB_POOL_MIN_SIZE', 'DB_POOL_MAX_SIZE', 'DB_POOL_TIMEOUT',
+    'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'REPLICA_DATABASE_URLS',
+]
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def load(self, **env):
+        """The project settings as the environment ``env`` would produce them"""
+        import setting.settings
+        with mock.patch.dict(os.environ, {'DEBUG': 'False'}):
+            for name in DATABASE_ENV:
+                os.environ.pop(name, None)
+            os.environ.update(env)
+            return runpy.run_path(setting.settings.__file__)
+
+    def test_keeps_and_checks_connections_by_default(self):
+        database = self.load(DATABASE_URL='postgres://user@db:5432/sweetbliss')['DATABASES']['default']
+
+        self.assertEqual(database['CONN_MAX_AGE'], 600)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database.get('OPTIONS', {}))
+
+    def test_connection_env_values(self):
+        database = self.load(
+            DATABASE_URL='postgres://user@db:5432/sweetbliss', CONN_MAX_AGE='60', CONN_HEALTH_CHECKS='False',
+        )['DATABASES']['default']
+
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+
+    def test_pool_replaces_persistent_connections_on_postgresql(self):
+        databases = self.load(
+            DATABASE_URL='postgres://user@db:5432/sweetbliss', DB_POOL='True', DB_POOL_MAX_SIZE='8',
+            DB_POOL_TIMEOUT='2.5', REPLICA_DATABASE_URLS='postgres://user@replica:5432/sweetbliss',
+        )['DATABASES']
+
+        pool = {'min_size': 2, 'max_size': 8, 'timeout': 2.5}
+        self.assertEqual(databases['default']['OPTIONS']['pool'], pool)
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 0)
+        self.assertEqual(databases['replica1']['OPTIONS']['pool'], pool)
+        self.assertEqual(databases['replica1']['CONN_MAX_AGE'], 0)
+
+    def test_pool_is_ignored_on_sqlite(self):
+        settings = self.load(DATABASE_URL='sqlite:////tmp/sweetbliss.sqlite3', DB_POOL='True')
+        database = settings['DATABASES']['default']
+
+        self.assertTrue(settings['DB_POOL'])
+        self.assertNotIn('pool', database.get('OPTIONS', {}))
+        self.assertEqual(database['CONN_MAX_AGE'], 600)
+
+
+class CriticalCSSTests(SimpleTestCase):
+    def setUp(self):
+        critical_css.critical_files.clear()
+        self.addCleanup(critical_css.critical_files.clear)
+
+    def test_reads_the_generated_files(self):
+        self.assertIn('{', critical_css.get_critical_css('home_page'))
+        self.assertIsNone(critical_css.get_critical_css('no_such_page'))
+        self.assertIsNone(critical_css.get_critical_css(''))
+
+    def test_css_is_plain_text_read_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'critical', 'test_page.css')
+            path.parent.mkdir()
+            css = '.hero::before{content:"{% now Y %} {{ x }}"}\n#main{color:red}{#x}'
+            path.write_text(css, encoding='utf-8')
+
+            with self.settings(STATICFILES_DIRS=[directory], DEBUG=False):
+                self.assertEqual(critical_css.get_critical_css('test_page'), css)
+                path.write_text('.changed{}', encoding='utf-8')
+                self.assertEqual(critical_css.get_critical_css('test_page'), css)
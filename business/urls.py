@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from rest_framework.routers import DefaultRouter
 from . import views
 
@@ -14,4 +14,13 @@ urlpatterns = [
     # API endpoints for AJAX functionality
     path('api/search/', views.product_search, name='product_search'),
     path('api/contact/', views.contact_form, name='contact_form'),
+
+    # Incremental sync and full catalogue downloads
+    path('changes/', views.change_feed, name='change_feed'),
+    path('specs/', views.specification_values, name='specification_values'),
+    re_path(
+        r'^export/products\.(?P<export_format>csv|jsonl|xlsx)$',
+        views.catalogue_export,
+        name='catalogue_export',
+    ),
 ] + router.urls
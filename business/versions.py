@@ -0,0 +1,88 @@
+"""
+Content versions for template fragment caching.
+
+Shared blocks such as the partner carousel or the footer are cached with
+``{% cache %}`` and vary on the version of the content they show::
+
+    {% cache 86400 partner_carousel content_version.partner %}
+
+Saving a partner bumps the "partner" version, so the next render stores a
+fresh fragment under a new key and the old one simply expires. Versions
+live in the ``CONTENT_VERSION_CACHE_ALIAS`` cache, which every worker
+process must share for a bump to reach them all, and start from the
+current time, so a version lost to eviction can never come back as an
+older value.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import Signal
+
+
+# Sent with ``scopes`` once a bump is stored
+content_version_bumped = Signal()
+
+
+def version_cache():
+    return caches[getattr(settings, 'CONTENT_VERSION_CACHE_ALIAS', 'default')]
+
+
+def version_key(scope):
+    return f"content_version:{scope}"
+
+
+def get_content_version(scope):
+    cache = version_cache()
+    version = cache.get(version_key(scope))
+    if version is None:
+        cache.add(version_key(scope), time.time_ns(), None)
+        version = cache.get(version_key(scope))
+    return version
+
+
+def get_content_versions(*scopes):
+    """Versions of ``scopes``, in order, read together"""
+    cache = version_cache()
+    versions = cache.get_many([version_key(scope) for scope in scopes])
+    missing = [scope for scope in scopes if version_key(scope) not in versions]
+    for scope in missing:
+        versions[version_key(scope)] = get_content_version(scope)
+    return [versions[version_key(scope)] for scope in scopes]
+
+
+async def aget_content_version(scope):
+    cache = version_cache()
+    version = await cache.aget(version_key(scope))
+    if version is None:
+        await cache.aadd(version_key(scope), time.time_ns(), None)
+        version = await cache.aget(version_key(scope))
+    return version
+
+
+def bump_content_version(*scopes):
+    """Invalidate the fragments of ``scopes`` once the transaction commits"""
+    def bump():
+        version = time.time_ns()
+        version_cache().set_many({version_key(scope): version for scope in scopes}, None)
+        content_version_bumped.send(sender=None, scopes=scopes)
+
+    transaction.on_commit(bump)
+
+
+class ContentVersions:
+    """Looks versions up as templates ask for them, once per render"""
+
+    def __init__(self):
+        self.versions = {}
+
+    def __getitem__(self, scope):
+        if scope not in self.versions:
+            self.versions[scope] = get_content_version(scope)
+        return self.versions[scope]
+
+
+def content_versions(request):
+    """Context processor providing ``content_version.<scope>``"""
+    return {'content_version': ContentVersions()}
@@ -1,19 +1,27 @@
+import re
+import tempfile
+from collections import defaultdict
+
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
-from django.core.mail import send_mail
-from django.conf import settings
+from django.views.decorators.http import require_GET, require_safe
 from django.db import models
+from django_tasks import ResultStatus
 from rest_framework import viewsets, filters
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
-from .models import Product, Brand, ProductCategory
+from .catalogue import EXPORT_FORMATS, SPEC_PREFIX, export_rows, iter_csv, iter_gzip, iter_jsonl, write_xlsx
+from .models import Product, Brand, Partner, ProductCategory, ProductSpecValue, CatalogueChange
+from .search_cache import normalize_query, search_cache
+from .tasks import send_contact_email
 import json
 
 
 # Temporary simple serializers (we'll create proper ones next)
 class ProductSerializer:
-    def __init__(self, instance, many=False):
+    def __init__(self, instance, many=False, **kwargs):
         self.instance = instance
         self.many = many
     
@@ -36,7 +44,7 @@ class ProductSerializer:
 
 
 class BrandSerializer:
-    def __init__(self, instance, many=False):
+    def __init__(self, instance, many=False, **kwargs):
         self.instance = instance
         self.many = many
     
@@ -56,7 +64,7 @@ class BrandSerializer:
 
 
 class CategorySerializer:
-    def __init__(self, instance, many=False):
+    def __init__(self, instance, many=False, **kwargs):
         self.instance = instance
         self.many = many
     
@@ -75,14 +83,68 @@ class CategorySerializer:
         }
 
 
+class PartnerSerializer:
+    def __init__(self, instance, many=False, **kwargs):
+        self.instance = instance
+        self.many = many
+    
+    @property
+    def data(self):
+        if self.many:
+            return [self._serialize_partner(item) for item in self.instance]
+        return self._serialize_partner(self.instance)
+    
+    def _serialize_partner(self, partner):
+        return {
+            'id': partner.id,
+            'name': partner.name,
+            'description': partner.description,
+            'logo_url': partner.logo_url,
+            'website_url': partner.website_url,
+            'country_of_origin': partner.country_of_origin,
+        }
+
+
+# Specification keys accepted in "spec.<key>=<value>" query parameters
+SPEC_KEY_RE = re.compile(r'^[A-Za-z0-9]+(_[A-Za-z0-9]+)*$')
+
+
+def specification_filters(params):
+    """Collect ``spec.<key>=<value>`` query parameters into a dict"""
+    specifications = {}
+    for name, value in params.items():
+        if name.startswith(SPEC_PREFIX) and value:
+            key = name[len(SPEC_PREFIX):]
+            if SPEC_KEY_RE.match(key):
+                specifications[key] = value
+    return specifications
+
+
+class SpecificationFilter(filters.BaseFilterBackend):
+    """Filter products by ``spec.<key>=<value>`` query parameters"""
+    
+    def filter_queryset(self, request, queryset, view):
+        specifications = specification_filters(request.query_params)
+        if specifications:
+            queryset = queryset.with_specifications(specifications)
+        return queryset
+
+
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     """API viewset for products"""
     queryset = Product.objects.filter(is_active=True).select_related('brand', 'category')
     serializer_class = ProductSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [SpecificationFilter, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description', 'brand__name', 'category__name']
     ordering_fields = ['name', 'created_at']
     ordering = ['-created_at']
+    
+    @action(detail=True)
+    def related(self, request, pk=None):
+        """Precomputed related products, best match first"""
+        product = self.get_object()
+        serializer = ProductSerializer(product.related_products(), many=True)
+        return Response(serializer.data)
 
 
 class BrandViewSet(viewsets.ReadOnlyModelViewSet):
@@ -101,12 +163,24 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['name']
 
 
-@api_view(['GET'])
-def product_search(request):
-    """Advanced product search API"""
-    query = request.GET.get('q', '')
-    category = request.GET.get('category', '')
-    brand = request.GET.get('brand', '')
+@require_safe
+async def product_search(request):
+    """
+    Advanced product search API.
+    
+    Async, so under ASGI the worker serves other requests while the
+    queries run. Results are cached per normalised search until the
+    catalogue changes (business/search_cache.py).
+    """
+    query = normalize_query(request.GET.get('q', ''))
+    category = request.GET.get('category', '').strip()
+    brand = request.GET.get('brand', '').strip()
+    specifications = specification_filters(request.GET)
+    
+    key = await search_cache.key(query, category, brand, specifications)
+    content = await search_cache.aget(key)
+    if content is not None:
+        return HttpResponse(content, content_type='application/json')
     
     products = Product.objects.filter(is_active=True)
     
@@ -123,35 +197,161 @@ def product_search(request):
     if brand:
         products = products.filter(brand__name__iexact=brand)
     
+    if specifications:
+        products = products.with_specifications(specifications)
+    
     products = products.select_related('brand', 'category')[:20]
     
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    serializer = ProductSerializer([product async for product in products], many=True)
+    response = JsonResponse(serializer.data, safe=False)
+    await search_cache.aset(key, response.content)
+    return response
+
+
+@api_view(['GET'])
+def specification_values(request):
+    """Distinct specification values with product counts, grouped by key"""
+    catalogue = defaultdict(list)
+    values = ProductSpecValue.objects.filter(product_count__gt=0)
+    if request.GET.get('key'):
+        values = values.filter(key=request.GET['key'])
+    for key, value, count in values.values_list('key', 'value', 'product_count'):
+        catalogue[key].append({'value': value, 'count': count})
+    return Response(catalogue)
+
+
+@require_GET
+def catalogue_export(request, export_format):
+    """Stream the full active catalogue as CSV, JSON lines or an Excel workbook"""
+    rows = export_rows()
+    filename = f"sweetbliss-products.{export_format}"
+
+    if export_format == 'xlsx':
+        # Write-only workbooks need a real file to build the zip in
+        file = tempfile.TemporaryFile()
+        write_xlsx(rows, file)
+        file.seek(0)
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=filename,
+            content_type=EXPORT_FORMATS['xlsx'],
+        )
+
+    chunks = iter_csv(rows) if export_format == 'csv' else iter_jsonl(rows)
+    content_type = EXPORT_FORMATS[export_format]
+    if request.GET.get('gzip'):
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# Where the change feed reads the current state of each model; rows
+# missing from these querysets (deleted or deactivated) are sent as deletes.
+CHANGE_FEED_SOURCES = {
+    'product': (Product.objects.filter(is_active=True).select_related('brand', 'category'), ProductSerializer),
+    'brand': (Brand.objects.all(), BrandSerializer),
+    'partner': (Partner.objects.filter(is_active=True), PartnerSerializer),
+    'productcategory': (ProductCategory.objects.all(), CategorySerializer),
+}
+
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 1000
+
+
+# Never stored by a CDN or proxy: a feed page minutes old would hand a
+# partner a cursor that skips what changed since
+@never_cache
+@api_view(['GET'])
+def change_feed(request):
+    """Catalogue changes after a cursor, for incremental partner sync"""
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', CHANGE_FEED_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'since and limit must be integers'}, status=400)
+    limit = max(1, min(limit, CHANGE_FEED_MAX_PAGE_SIZE))
+    
+    entries = list(CatalogueChange.objects.filter(pk__gt=since).order_by('pk')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    # Only the latest entry per object matters within a page; re-inserting
+    # keeps the result ordered by each object's last change.
+    latest = {}
+    for entry in entries:
+        key = (entry.model, entry.object_id)
+        latest.pop(key, None)
+        latest[key] = entry
+    
+    # Current state of everything inserted or updated, one query per model
+    wanted = defaultdict(set)
+    for (model_name, object_id), entry in latest.items():
+        if entry.action != CatalogueChange.DELETE and model_name in CHANGE_FEED_SOURCES:
+            wanted[model_name].add(object_id)
+    current = {}
+    for model_name, object_ids in wanted.items():
+        queryset, serializer_class = CHANGE_FEED_SOURCES[model_name]
+        for obj in queryset.filter(pk__in=object_ids):
+            current[(model_name, obj.pk)] = serializer_class(obj).data
+    
+    changes = []
+    for key, entry in latest.items():
+        data = current.get(key)
+        changes.append({
+            'cursor': entry.pk,
+            'model': entry.model,
+            'id': entry.object_id,
+            'action': entry.action if data is not None else CatalogueChange.DELETE,
+            'changed_at': entry.changed_at,
+            'data': data,
+        })
+    
+    return Response({
+        'cursor': entries[-1].pk if entries else since,
+        'has_more': has_more,
+        'changes': changes,
+    })
 
 
 @csrf_exempt
-def contact_form(request):
-    """Handle contact form submissions"""
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            
-            name = data.get('name', '')
-            email = data.get('email', '')
-            company = data.get('company', '')
-            message = data.get('message', '')
-            subject = data.get('subject', 'Website Contact Form')
-            
-            # Validate required fields
-            if not all([name, email, message]):
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Please fill in all required fields.'
-                }, status=400)
-            
-            # Compose email
-            email_subject = f"[Sweet Bliss] {subject}"
-            email_body = f"""
+async def contact_form(request):
+    """
+    Handle contact form submissions.
+    
+    The email is handed to the send_contact_email task rather than sent
+    here, so a slow mail server doesn't hold up the response.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object.'}, status=400)
+    
+    name = data.get('name', '')
+    email = data.get('email', '')
+    company = data.get('company', '')
+    message = data.get('message', '')
+    subject = data.get('subject', 'Website Contact Form')
+    
+    # Validate required fields
+    if not all([name, email, message]):
+        return JsonResponse({
+            'success': False,
+            'error': 'Please fill in all required fields.'
+        }, status=400)
+    
+    # Compose email
+    email_subject = f"[Sweet Bliss] {subject}"
+    email_body = f"""
 New contact form submission:
 
 Name: {name}
@@ -164,26 +364,20 @@ Message:
 
 ---
 Sent from Sweet Bliss website contact form
-            """
-            
-            # Send email
-            send_mail(
-                email_subject,
-                email_body,
-                settings.DEFAULT_FROM_EMAIL,
-                ['azan@sweetbliss.pk'],  # Recipient email
-                fail_silently=False,
-            )
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Thank you for your message. We will get back to you soon!'
-            })
-            
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'error': 'There was an error sending your message. Please try again.'
-            }, status=500)
-    
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
+    """
+    
+    try:
+        result = await send_contact_email.aenqueue(email_subject, email_body)
+    except Exception:
+        result = None
+    # The immediate backend has already run the task; a queued one hasn't
+    if result is None or result.status == ResultStatus.FAILED:
+        return JsonResponse({
+            'success': False,
+            'error': 'There was an error sending your message. Please try again.'
+        }, status=500)
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Thank you for your message. We will get back to you soon!'
+    })
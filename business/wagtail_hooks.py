@@ -0,0 +1,9 @@
+from wagtail import hooks
+
+from .surrogate import add_surrogate_keys
+
+
+@hooks.register('before_serve_page')
+def tag_page_response(page, request, serve_args, serve_kwargs):
+    # "pages" covers what every page shows, such as the site settings
+    add_surrogate_keys(request, [f"page-{page.pk}", "pages"])
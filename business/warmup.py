@@ -0,0 +1,189 @@
+"""
+Warm-up for freshly started worker processes.
+
+The cached template loader compiles each template the first time it is
+used, so without a warm-up the first visitors after a deploy pay for
+parsing base.html, the header, the footer and the page templates in every
+worker. warm_templates() compiles everything under the project template
+directories up front; setting/wsgi.py and setting/asgi.py call it once the
+application is loaded.
+
+warm_site() goes further and requests every live page, the busiest
+``?category=`` listings and the API lists, as anonymous GETs built with
+RequestFactory and passed through the full middleware stack. This also
+fills the route table, site settings, image renditions and the page,
+fragment and product caches of the process it runs in, and the shared
+default cache. gunicorn.conf.py runs it in every new worker, the
+warm_caches command on demand, and with a background task backend
+publishing a page warms that page and its parent through the
+warm_published_page task.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.test import RequestFactory
+from django.urls import reverse
+from wagtail.models import Page
+
+from .models import ProductCategory, ProductsPage, product_slugs
+from .routing import page_routes
+from .search_cache import search_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(directory):
+    """Template names, relative to ``directory``, of every file under it"""
+    for root, dirs, files in os.walk(directory):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    """
+    Compile every project template into the template loader's cache.
+
+    Returns the number of templates compiled and the seconds it took.
+    """
+    started = time.perf_counter()
+    backend = engines['django']
+    count = 0
+    for directory in backend.engine.dirs:
+        for name in template_names(directory):
+            try:
+                backend.get_template(name)
+            except TemplateSyntaxError as e:
+                logger.warning("Couldn't precompile template %s: %s", name, e)
+            else:
+                count += 1
+    elapsed = time.perf_counter() - started
+    logger.info("Precompiled %d templates in %.0f ms", count, elapsed * 1000)
+    return count, elapsed
+
+
+# API responses fetched by warm_site()
+API_LIST_URLS = [
+    'business:product-list',
+    'business:brand-list',
+    'business:productcategory-list',
+    'business:specification_values',
+]
+
+
+def page_targets(page, categories=10):
+    """
+    ``(host, path)`` of a live page, and for products pages of its listing
+    filtered by each of the ``categories`` categories with most products.
+    """
+    url_parts = page.get_url_parts()
+    if url_parts is None:
+        return []
+    _, root_url, path = url_parts
+    host = urlsplit(root_url).hostname or 'localhost'
+    targets = [(host, path)]
+    if isinstance(page, ProductsPage) and categories:
+        names = ProductCategory.objects.filter(
+            active_product_count__gt=0
+        ).order_by('-active_product_count', 'name').values_list('name', flat=True)[:categories]
+        grid_path = path + page.reverse_subpage('product_grid')
+        for name in names:
+            query = urlencode({'category': name})
+            targets += [(host, f"{path}?{query}"), (host, f"{grid_path}?{query}")]
+    return targets
+
+
+def site_targets(categories=10, api=True):
+    """``(host, path)`` of every live page, its category variants and the API lists"""
+    targets = []
+    for page in Page.objects.live().specific().order_by('path'):
+        targets += page_targets(page, categories)
+    if api:
+        targets += [('localhost', reverse(name)) for name in API_LIST_URLS]
+    return targets
+
+
+# Loads the middleware once, which for WhiteNoise means scanning the static
+# files. Unlike the test client it leaves the request_started and
+# request_finished receivers alone, which real requests served by this
+# process at the same time rely on
+handler = None
+handler_lock = threading.Lock()
+
+
+def get_handler():
+    global handler
+    with handler_lock:
+        if handler is None:
+            handler = WSGIHandler()
+    return handler
+
+
+def fetch(target):
+    """Request ``(host, path)``; returns its status (None on error) and milliseconds"""
+    host, path = target
+    warm_handler = get_handler()
+    started = time.perf_counter()
+    try:
+        response = warm_handler.get_response(RequestFactory().get(path, SERVER_NAME=host))
+        # Streamed responses only do their work as they are read
+        for _ in response:
+            pass
+        response.close()
+        status = response.status_code
+    except Exception as e:
+        logger.warning("Couldn't warm %s%s: %s", host, path, e)
+        status = None
+    finally:
+        # close_old_connections only closes broken or expired ones, and the
+        # master must not fork with a connection open
+        connections.close_all()
+    return status, (time.perf_counter() - started) * 1000
+
+
+def warm_site(targets, concurrency=4):
+    """
+    Request ``targets``, at most ``concurrency`` at a time.
+
+    Returns ``(host, path, status, milliseconds)`` for each target, in order.
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max(concurrency, 1)) as pool:
+        results = [(*target, *result) for target, result in zip(targets, pool.map(fetch, targets))]
+    logger.info(
+        "Warmed %d URLs in %.0f ms, %d failed", len(results), (time.perf_counter() - started) * 1000,
+        sum(1 for result in results if result[2] != 200),
+    )
+    return results
+
+
+def reset_process_state():
+    """
+    Close this process's database connections and pools and drop the
+    content it caches in memory.
+
+    The gunicorn master calls this before forking a worker, so the worker
+    neither shares the master's connections nor starts from what the
+    master cached when it was warmed.
+    """
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            # PostgreSQL; a no-op unless the database is pooled
+            connection.close_pool()
+    for cache in caches.all(initialized_only=True):
+        if isinstance(cache, LocMemCache):
+            cache.clear()
+    page_routes.clear()
+    product_slugs.clear()
+    search_cache.local.clear()
@@ -0,0 +1,110 @@
+"""
+Gunicorn production profile, read by ``gunicorn`` from the project root.
+
+    gunicorn                                   # gthread workers, WSGI
+    GUNICORN_WORKER_CLASS=uvicorn gunicorn     # uvicorn workers, ASGI
+
+With GUNICORN_PRELOAD the application is loaded and warmed once in the
+master, and the workers it forks share those pages of memory copy-on-write
+instead of each importing Django and Wagtail and compiling the templates.
+Before forking, the master closes its database connections and pools,
+which can't be shared between processes, and drops the content it cached
+in memory: a worker forked hours later to replace a recycled one must not
+start from the master's stale copy. Each worker then warms its own caches
+(GUNICORN_WARM_CACHES) in a background thread while it serves requests,
+so a slow warm-up can't hold up the heartbeat and get the worker killed
+after ``timeout``.
+
+Under uvicorn workers Django opens a connection per request thread, so
+connections are never kept (CONN_MAX_AGE=0); use DB_POOL=True to reuse
+them.
+
+Workers are sized from the CPUs the process may run on and recycled after
+about GUNICORN_MAX_REQUESTS requests, with jitter so they don't restart
+together. ``python manage.py benchmark_gunicorn`` measures startup time
+and memory per worker for these settings.
+"""
+import gc
+import os
+import threading
+
+
+def env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+def cpu_count():
+    # CPUs this process may run on, which containers often limit
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setting.settings')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'uvicorn':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'setting.asgi:application'
+    # An event loop keeps one core busy
+    workers = env_int('WEB_CONCURRENCY', max(cpu_count(), 2))
+    # Each request runs its ORM calls in a new thread with its own
+    # connection, which a non-zero CONN_MAX_AGE would leave open
+    os.environ['CONN_MAX_AGE'] = '0'
+else:
+    wsgi_app = 'setting.wsgi:application'
+    # Threads overlap waits on the database; keep them at or below
+    # DB_POOL_MAX_SIZE when pooling
+    threads = env_int('GUNICORN_THREADS', 4)
+    workers = env_int('WEB_CONCURRENCY', cpu_count() + 1)
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+warm_caches = os.environ.get('GUNICORN_WARM_CACHES', 'True') == 'True'
+
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = 30
+keepalive = 5
+
+
+def warm(log):
+    from business.warmup import site_targets, warm_site
+
+    results = warm_site(site_targets(), concurrency=1)
+    failed = sum(1 for result in results if result[2] != 200)
+    log.info("Warmed %d URLs in %.0f ms, %d failed", len(results), sum(result[3] for result in results), failed)
+
+
+def when_ready(server):
+    if preload_app and warm_caches:
+        # Compiled code, block definitions and renditions are shared with
+        # every worker; the content caches are dropped in pre_fork
+        warm(server.log)
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from business.warmup import reset_process_state
+        reset_process_state()
+        # Keep the garbage collector of each worker from writing to the
+        # objects it shares with the master, which would copy their pages
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # pre_fork leaves nothing open; this only guards against the
+        # worker ever using a connection of the master's
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    """In each worker once the application is loaded, before it accepts requests"""
+    if warm_caches:
+        # The worker only starts notifying the master once this returns
+        threading.Thread(target=warm, args=(worker.log,), name='warm-caches', daemon=True).start()
@@ -71,6 +71,8 @@ INSTALLED_APPS = [
     'taggit',
     'modelcluster',
     'rest_framework',
+    'django_tasks',
+    'django_tasks.backends.database',
     
     # Custom apps
     'business',
@@ -79,17 +81,78 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'business.static_assets.WhiteNoiseMiddleware',
+    'business.html.CompressionMiddleware',
+    'business.middleware.FastPathMiddleware',
+    'business.replicas.ReplicaMiddleware',
+    'business.surrogate.SurrogateKeyMiddleware',
+    'business.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'business.middleware.AuthenticationMiddleware',
+    'business.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
     'wagtail.contrib.redirects.middleware.RedirectMiddleware',
 ]
 
+# Anonymous GETs outside the admin skip session, auth and messages and are
+# sent as publicly cacheable for PUBLIC_CACHE_SECONDS (business/middleware.py)
+PUBLIC_FAST_PATH = os.environ.get('PUBLIC_FAST_PATH', 'True') == 'True'
+PUBLIC_CACHE_SECONDS = int(os.environ.get('PUBLIC_CACHE_SECONDS', 300))
+
+# Shared caches purged by surrogate key when content changes
+# (business/surrogate.py)
+SURROGATE_PURGE_BACKENDS = {}
+if os.environ.get('SURROGATE_PURGE_URL'):
+    SURROGATE_PURGE_BACKENDS['proxy'] = {
+        'BACKEND': 'business.surrogate.HTTPPurgeBackend',
+        'LOCATION': os.environ['SURROGATE_PURGE_URL'],
+    }
+
+# Minified HTML and Brotli/gzip for dynamic responses (business/html.py).
+# HTML_BYTE_BUDGETS maps page types (template names, e.g. 'home_page') or
+# 'default' to the minified size above which a warning is logged
+HTML_MINIFY = os.environ.get('HTML_MINIFY', 'True') == 'True'
+HTML_BYTE_BUDGETS = {}
+
+# The default cache is shared by every worker process: content versions
+# (business/versions.py), product pages and search results must be
+# invalidated everywhere at once. It is Redis when REDIS_URL is set and the
+# django_cache table otherwise (created by the business 0011 migration).
+# Template fragments, keyed by those shared versions, and minified HTML,
+# keyed by its content, can't go stale and are kept in each process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 20000))},
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+    },
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+CONTENT_VERSION_CACHE_ALIAS = 'default'
+
+# Product search results cached per process (SEARCH_CACHE_SIZE results) and
+# in the SEARCH_CACHE_ALIAS cache for SEARCH_CACHE_SECONDS, until the
+# catalogue changes (business/search_cache.py)
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 512))
+SEARCH_CACHE_SECONDS = int(os.environ.get('SEARCH_CACHE_SECONDS', 60))
+# Seconds a worker may go on using the catalogue version it last read
+SEARCH_CACHE_VERSION_SECONDS = float(os.environ.get('SEARCH_CACHE_VERSION_SECONDS', 2))
+SEARCH_CACHE_ALIAS = 'default'
+
 ROOT_URLCONF = 'setting.urls'
 
 TEMPLATES = [
@@ -104,11 +167,30 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'wagtail.contrib.settings.context_processors.settings',
+                'business.versions.content_versions',
             ],
         },
     },
 ]
 
+# Production keeps compiled templates in memory for the life of the worker,
+# and each worker compiles every template at startup (business/warmup.py)
+# so the first requests after a deploy don't pay for parsing them
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+WARM_TEMPLATES_ON_STARTUP = os.environ.get('WARM_TEMPLATES_ON_STARTUP', 'True') == 'True'
+
+# Publishing a page renders it and its parent again through the
+# warm_published_page task, so caches are refilled before visitors arrive.
+# Unset, only when tasks run in a worker rather than the publishing request
+WARM_ON_PUBLISH = {'True': True, 'False': False}.get(os.environ.get('WARM_ON_PUBLISH'))
+
 WSGI_APPLICATION = 'setting.wsgi.application'
 
 
@@ -120,11 +202,20 @@ STATIC_URL = '/static/'
 
 if is_development == 'False':
     DATABASES = {
-    "default": dj_database_url.config(default=os.environ.get("DATABASE_URL"),
-                                      conn_max_age=600)
+    "default": dj_database_url.config(default=os.environ.get("DATABASE_URL"))
 }
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    # Fingerprinted, precompressed static files with optimised images
+    # (business/static_assets.py). STATICFILES_STORAGE is no longer read
+    # since Django 5.1, so the storage is set through STORAGES
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'business.static_assets.StaticFilesStorage',
+        },
+    }
     STATICFILES_DIRS = [
         os.path.join(BASE_DIR, 'static'),
     ]
@@ -150,6 +241,41 @@ else:
     # Media files
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# Connections are kept for CONN_MAX_AGE seconds and checked before they are
+# reused, so a Postgres restart doesn't surface as errors. With DB_POOL=True
+# each worker process borrows connections from a psycopg 3 pool of
+# DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE instead; size it to the worker's
+# threads (business/metrics.py reports how busy it is)
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.environ.get('CONN_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Read replicas for public GET requests (business/replicas.py), one per URL
+# in the comma-separated REPLICA_DATABASE_URLS. A replica more than
+# REPLICA_MAX_LAG seconds behind is skipped, and reads stay on the primary
+# for REPLICA_STICKY_SECONDS after a write
+for number, url in enumerate(filter(None, os.environ.get('REPLICA_DATABASE_URLS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **dj_database_url.parse(url.strip()),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': DATABASES['default']['CONN_HEALTH_CHECKS'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if 'pool' in DATABASES['default'].get('OPTIONS', {}):
+        DATABASES[f'replica{number}'].setdefault('OPTIONS', {})['pool'] = DATABASES['default']['OPTIONS']['pool']
+DATABASE_ROUTERS = ['business.replicas.ReplicaRouter']
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5))
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -203,12 +329,28 @@ WAGTAILSEARCH_BACKENDS = {
     }
 }
 
+# With the database task backend, saves queue search index updates
+# (business/search_index.py), applied by a background task in batches of
+# SEARCH_INDEX_BATCH_SIZE objects after SEARCH_INDEX_DELAY seconds, so edits
+# made in the meantime join the batch. Bulk writes always use the queue.
+SEARCH_INDEX_DELAY = int(os.environ.get('SEARCH_INDEX_DELAY', 5))
+SEARCH_INDEX_BATCH_SIZE = int(os.environ.get('SEARCH_INDEX_BATCH_SIZE', 500))
+
 # Allowed image formats
 WAGTAILIMAGES_EXTENSIONS = ['gif', 'jpg', 'jpeg', 'png', 'webp', 'svg']
 
 # Email settings (for form submissions)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Background tasks such as contact form emails (business/tasks.py). Tasks
+# run as they are enqueued unless TASKS_BACKEND is set to
+# django_tasks.backends.database.DatabaseBackend and a db_worker is running
+TASKS = {
+    'default': {
+        'BACKEND': os.environ.get('TASKS_BACKEND', 'django_tasks.backends.immediate.ImmediateBackend'),
+    },
+}
+
 # Security settings for production
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
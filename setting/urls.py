@@ -23,6 +23,8 @@ from wagtail.admin import urls as wagtailadmin_urls
 from wagtail import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 
+from business import metrics, routing
+
 urlpatterns = [
     path('django-admin/', admin.site.urls),
     path('admin/', include(wagtailadmin_urls)),
@@ -31,8 +33,14 @@ urlpatterns = [
     # Business app URLs
     path('api/', include('business.urls')),
     
-    # Wagtail pages - should be last
-    re_path(r'', include(wagtail_urls)),
+    # Worker metrics for staff (business/metrics.py)
+    path('_util/metrics/', metrics.metrics, name='metrics'),
+    
+    # Wagtail pages - should be last. Pages are served through
+    # business.routing, which resolves routes from an in-memory table.
+    re_path(r'', include(wagtail_urls.urlpatterns[:-1] + [
+        re_path(wagtail_urls.serve_pattern, routing.serve, name='wagtail_serve'),
+    ])),
 ]
 
 # Serve media files in development